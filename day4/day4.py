@@ -14,7 +14,26 @@
 
 # so, there is, without a doubt, a python library for this..
 # and there is.. hashlib..
+import asyncio
 import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from itertools import count
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# the last three digits of a number as ascii, without and with leading zeros
+_DIGITS = [str(i).encode("ascii") for i in range(1000)]
+_PADDED_DIGITS = [f"{i:03}".encode("ascii") for i in range(1000)]
 
 
 def hash_for_key(the_data: str) -> str:
@@ -33,16 +52,434 @@ def find_lowest_matching_hash_for_key(
     """
     Return the lowest non-negative integer where the md5 hash of the_base+str(i) starts with desired_hash_prefix
     """
-    i = 0
-    while not hash_for_key(the_base + str(i)).startswith(desired_hash_prefix):
+    return _search_block(the_base, desired_hash_prefix, 0)
+
+
+def _digest_prefix(desired_hash_prefix: str) -> Tuple[bytes, Optional[int]]:
+    """
+    Turn a hex digest prefix into the raw digest bytes it covers, plus the value of the top nibble of the next byte
+    when the prefix has an odd length, so "00000" is (b"\\x00\\x00", 0)
+    Raises ValueError if the prefix isn't lowercase hex, which hexdigest() would never match anyway
+    """
+    if any(c not in "0123456789abcdef" for c in desired_hash_prefix):
+        raise ValueError(f"{desired_hash_prefix} is not a lowercase hex prefix")
+    whole = len(desired_hash_prefix) // 2 * 2
+    nibble = None
+    if whole < len(desired_hash_prefix):
+        nibble = int(desired_hash_prefix[whole], 16)
+    return bytes.fromhex(desired_hash_prefix[:whole]), nibble
+
+
+def _search_block(
+    the_base: str, desired_hash_prefix: str, start: int, stop: Optional[int] = None
+) -> Optional[int]:
+    """
+    Return the lowest i in range(start, stop) where the md5 hash of the_base+str(i) starts with desired_hash_prefix, or None
+    stop=None keeps going until there is a match
+    """
+    return _search_block_all(the_base, [desired_hash_prefix], start, stop).get(
+        desired_hash_prefix
+    )
+
+
+def _scan(
+    the_base: str, desired_hash_prefix: str, start: int, stop: Optional[int] = None
+) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yield (i, raw md5 digest) for every i in range(start, stop) where the md5 hash of the_base+str(i) starts with
+    desired_hash_prefix, in increasing order. stop=None never stops.
+    """
+    try:
+        whole, nibble = _digest_prefix(desired_hash_prefix)
+    except ValueError:
+        # can't match on the raw bytes, do it the slow way
+        for i in count(start) if stop is None else range(start, stop):
+            hex_digest = hash_for_key(the_base + str(i))
+            if hex_digest.startswith(desired_hash_prefix):
+                yield i, bytes.fromhex(hex_digest)
+        return
+
+    # hash the key once and carry on from copies of that state, the numbers are done a thousand at a time
+    # so that the leading digits only go in once and the last three come from a ready made table of bytes,
+    # then we look at the raw digest rather than building the hex string
+    base_hasher = hashlib.md5(the_base.encode("utf-8"))
+    next_byte = len(whole)
+    i = start
+    while stop is None or i < stop:
+        thousands, low = divmod(i, 1000)
+        high = 1000 if stop is None else min(1000, stop - thousands * 1000)
+        if 0 == thousands:
+            copy = base_hasher.copy
+            suffixes = _DIGITS
+        else:
+            thousands_hasher = base_hasher.copy()
+            thousands_hasher.update(b"%d" % thousands)
+            copy = thousands_hasher.copy
+            suffixes = _PADDED_DIGITS
+        for this_low in range(low, high):
+            hasher = copy()
+            hasher.update(suffixes[this_low])
+            digest = hasher.digest()
+            if digest.startswith(whole) and (
+                nibble is None or digest[next_byte] >> 4 == nibble
+            ):
+                yield thousands * 1000 + this_low, digest
+        i = thousands * 1000 + high
+
+
+def _search_block_all(
+    the_base: str,
+    desired_hash_prefixes: Iterable[str],
+    start: int,
+    stop: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Scan range(start, stop) once and return {prefix: lowest i whose hash starts with it} for every prefix that turns up,
+    stopping as soon as they all have. stop=None keeps going until they all have.
+    """
+    remaining = set(desired_hash_prefixes)
+    found = dict()
+    i = start
+    while remaining:
+        # anything that matches a target has to match the prefix they all share, which is all the scan checks,
+        # each time a target turns up we carry on with a (possibly) longer shared prefix
+        narrowed = False
+        for i, digest in _scan(
+            the_base, os.path.commonprefix(list(remaining)), i, stop
+        ):
+            hex_digest = digest.hex()
+            hits = [prefix for prefix in remaining if hex_digest.startswith(prefix)]
+            for prefix in hits:
+                found[prefix] = i
+                remaining.remove(prefix)
+            if hits:
+                narrowed = True
+                break
+        if not narrowed:
+            # reached stop
+            break
         i += 1
+    return found
+
+
+def _matches_in_block(
+    the_base: str, desired_hash_prefix: str, start: int, stop: int
+) -> List[Tuple[int, str]]:
+    """
+    Return [(i, hex digest)] for every match in range(start, stop)
+    """
+    return [
+        (i, digest.hex())
+        for i, digest in _scan(the_base, desired_hash_prefix, start, stop)
+    ]
+
+
+def iter_matching_hashes(
+    the_base: str,
+    desired_hash_prefix: str,
+    lo: int,
+    hi: int,
+    workers: int = 1,
+    chunk_size: int = 100_000,
+    cancel: Optional[threading.Event] = None,
+    pool: Optional[Executor] = None,
+) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (i, hex digest) for every i in range(lo, hi) where the md5 hash of the_base+str(i) starts with
+    desired_hash_prefix, in increasing order of i.
+    The range is worked through in chunks of chunk_size, with workers > 1 the chunks go out to a pool of processes (or
+    pool, if given) a few at a time and their results come back in chunk order. Setting cancel, or closing the
+    generator, stops the search before the next chunk.
+    """
+    starts = range(lo, hi, chunk_size)
+    if workers <= 1 and pool is None:
+        for start in starts:
+            if cancel is not None and cancel.is_set():
+                return
+            yield from _matches_in_block(
+                the_base, desired_hash_prefix, start, min(start + chunk_size, hi)
+            )
+        return
+
+    own_pool = pool is None
+    if own_pool:
+        pool = ProcessPoolExecutor(max_workers=workers)
+    # chunks in flight, oldest first
+    in_flight = deque()
+    next_chunk = iter(starts)
+    try:
+        while True:
+            while len(in_flight) < 2 * workers:
+                if cancel is not None and cancel.is_set():
+                    return
+                start = next(next_chunk, None)
+                if start is None:
+                    break
+                in_flight.append(
+                    pool.submit(
+                        _matches_in_block,
+                        the_base,
+                        desired_hash_prefix,
+                        start,
+                        min(start + chunk_size, hi),
+                    )
+                )
+            if not in_flight:
+                return
+            yield from in_flight.popleft().result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+        if own_pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def find_lowest_matching_hashes_for_key(
+    the_base: str, desired_hash_prefixes: Iterable[str]
+) -> Dict[str, int]:
+    """
+    Return {prefix: lowest non-negative integer where the md5 hash of the_base+str(i) starts with prefix} for all the
+    prefixes from a single pass, so "00000" and "000000" together cost no more than "000000" alone
+    """
+    return _search_block_all(the_base, desired_hash_prefixes, 0)
+
+
+def find_lowest_matching_hash_parallel(
+    the_base: str,
+    desired_hash_prefix: str = "00000",
+    workers: Optional[int] = None,
+    block_size: int = 50_000,
+) -> int:
+    """
+    Same answer as find_lowest_matching_hash_for_key, but the integers are handed out in blocks to a pool of processes.
+    Once a block finds a hit we stop handing out blocks, but still wait for every block below the hit to finish so
+    that the lowest match wins.
+    """
+    for _, found in mine_many(
+        [the_base], [desired_hash_prefix], workers=workers, block_size=block_size
+    ):
+        return found[desired_hash_prefix]
 
-    return i
+
+class _KeyMiner:
+    """
+    Bookkeeping for one secret key while mine_many() works on it
+    """
+
+    def __init__(self, key: str, desired_hash_prefixes: List[str]):
+        self.key = key
+        self.prefixes = desired_hash_prefixes
+        # prefix -> lowest matching integer seen so far
+        self.found = dict()
+        # future -> first integer of its block
+        self.pending = dict()
+        self.next_start = 0
+
+    def wants_more(self) -> bool:
+        """
+        True until every prefix has turned up somewhere
+        """
+        return len(self.found) < len(self.prefixes)
+
+    def submit(self, pool: Executor, block_size: int) -> Future:
+        """
+        Hand the next block to the pool, only looking for the prefixes we haven't seen yet
+        """
+        missing = [prefix for prefix in self.prefixes if prefix not in self.found]
+        future = pool.submit(
+            _search_block_all,
+            self.key,
+            missing,
+            self.next_start,
+            self.next_start + block_size,
+        )
+        self.pending[future] = self.next_start
+        self.next_start += block_size
+        return future
+
+    def block_done(self, future: Future):
+        del self.pending[future]
+        for prefix, i in future.result().items():
+            if prefix not in self.found or i < self.found[prefix]:
+                self.found[prefix] = i
+
+    def is_final(self) -> bool:
+        """
+        True once every prefix is found and nothing still running could find a lower one
+        """
+        if self.wants_more():
+            return False
+        # nothing to look for at all is final straight away
+        highest = max(self.found.values(), default=-1)
+        return all(start > highest for start in self.pending.values())
+
+
+def mine_many(
+    keys: Iterable[str],
+    desired_hash_prefixes: Iterable[str] = ("00000",),
+    workers: Optional[int] = None,
+    block_size: int = 50_000,
+    pool: Optional[Executor] = None,
+) -> Iterator[Tuple[str, Dict[str, int]]]:
+    """
+    Find the lowest matching integer for every prefix for every key, sharing one pool of processes between them all.
+    Blocks of (key, integer range) are handed out round robin across the keys that still need them, with only a
+    couple per worker queued at a time so whichever worker is free picks up the next one. Yields (key, {prefix: i})
+    as soon as each key's answers are final, which is not necessarily the order they were given in.
+    Pass pool to share an existing executor, otherwise one is made (with workers processes) and shut down afterwards.
+    """
+    desired_hash_prefixes = list(desired_hash_prefixes)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    own_pool = pool is None
+    if own_pool:
+        pool = ProcessPoolExecutor(max_workers=workers)
+
+    active = [_KeyMiner(key, desired_hash_prefixes) for key in dict.fromkeys(keys)]
+    # future -> the miner it belongs to
+    owners = dict()
+    turn = 0
+    try:
+        while active:
+            # top up the queue, taking turns between the keys that still need blocks
+            hungry = [miner for miner in active if miner.wants_more()]
+            while hungry and len(owners) < 2 * workers:
+                miner = hungry[turn % len(hungry)]
+                owners[miner.submit(pool, block_size)] = miner
+                turn += 1
+
+            done, _ = wait(owners, return_when=FIRST_COMPLETED)
+            for future in done:
+                owners.pop(future).block_done(future)
+
+            for miner in [miner for miner in active if miner.is_final()]:
+                active.remove(miner)
+                # whatever it still has out there can't change the answer
+                for future in miner.pending:
+                    future.cancel()
+                    owners.pop(future, None)
+                yield miner.key, dict(miner.found)
+    finally:
+        for future in owners:
+            future.cancel()
+        if own_pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _write_search_state(state_file: str, state: dict):
+    """
+    Replace the state file in one go, so an interruption can't leave half of one behind
+    """
+    temp_file = f"{state_file}.tmp"
+    with open(temp_file, "w") as f:
+        json.dump(state, f)
+    os.replace(temp_file, state_file)
+
+
+def find_lowest_matching_hash_resumable(
+    the_base: str,
+    desired_hash_prefix: str,
+    state_file: str,
+    checkpoint_every: int = 1_000_000,
+    progress: Optional[Callable[[int, float, Optional[float]], None]] = None,
+) -> int:
+    """
+    Same answer as find_lowest_matching_hash_for_key, but every checkpoint_every integers the highest fully searched
+    integer is written to state_file, and a later call with the same key and prefix carries on from there.
+    progress, if given, is called after each checkpoint with (integers searched so far, hashes per second, ETA in
+    seconds), the ETA being how long until we've tried as many integers as a match needs on average.
+    """
+    start = 0
+    if os.path.exists(state_file):
+        with open(state_file, "r") as f:
+            state = json.load(f)
+        if state["key"] == the_base and state["prefix"] == desired_hash_prefix:
+            if state.get("answer") is not None:
+                return state["answer"]
+            start = state["searched_to"]
+
+    # a hex prefix of n characters turns up once every 16^n hashes on average
+    expected_hashes = 16 ** len(desired_hash_prefix)
+    started_at = time.monotonic()
+    resumed_from = start
+    while True:
+        stop = start + checkpoint_every
+        answer = _search_block(the_base, desired_hash_prefix, start, stop)
+        state = {
+            "key": the_base,
+            "prefix": desired_hash_prefix,
+            "searched_to": stop if answer is None else answer,
+            "answer": answer,
+        }
+        _write_search_state(state_file, state)
+        if answer is not None:
+            return answer
+        start = stop
+
+        if progress is not None:
+            elapsed = time.monotonic() - started_at
+            rate = (start - resumed_from) / elapsed if elapsed > 0 else 0.0
+            eta = max(0, expected_hashes - start) / rate if rate > 0 else None
+            progress(start, rate, eta)
+
+
+# made on first use by find_lowest_matching_hash_async and shared by every call after that
+_async_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _shared_pool() -> ProcessPoolExecutor:
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = ProcessPoolExecutor()
+    return _async_pool
+
+
+async def find_lowest_matching_hash_async(
+    the_base: str,
+    desired_hash_prefix: str = "00000",
+    pool: Optional[Executor] = None,
+    workers: Optional[int] = None,
+    block_size: int = 50_000,
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Same answer as find_lowest_matching_hash_parallel, but awaitable, the event loop gets control back every time a
+    block finishes. Blocks go to pool, or to one process pool shared by every call that doesn't pass its own, with at
+    most 2 * workers of ours queued at a time so that other calls get a look in.
+    If the call is cancelled (asyncio.wait_for timing out, say) the blocks still queued are cancelled, the ones
+    already running are small enough to just be left to finish.
+    progress, if given, is called with the integer below which everything has been searched each time that moves.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if pool is None:
+        pool = _shared_pool()
+    miner = _KeyMiner(the_base, [desired_hash_prefix])
+    # asyncio future -> the pool future it wraps
+    waiting = dict()
+    searched = 0
+    try:
+        while not miner.is_final():
+            while miner.wants_more() and len(waiting) < 2 * workers:
+                future = miner.submit(pool, block_size)
+                waiting[asyncio.wrap_future(future)] = future
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            for wrapped in done:
+                miner.block_done(waiting.pop(wrapped))
+            lowest_pending = min(miner.pending.values(), default=miner.next_start)
+            if progress is not None and lowest_pending > searched:
+                searched = lowest_pending
+                progress(searched)
+    finally:
+        for future in waiting.values():
+            future.cancel()
+    return miner.found[desired_hash_prefix]
 
 
 # main
 if __name__ == "__main__":
     data = "iwrupvqb"
-    part1 = find_lowest_matching_hash_for_key(data, desired_hash_prefix="00000")
-    part2 = find_lowest_matching_hash_for_key(data, desired_hash_prefix="000000")
+    answers = find_lowest_matching_hashes_for_key(data, ["00000", "000000"])
+    part1 = answers["00000"]
+    part2 = answers["000000"]
     print(f"md5 for [{data}] part1=[{part1}], part2=[{part2}]")
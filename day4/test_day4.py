@@ -2,8 +2,23 @@
 #  tests for the function that we're using in day4
 #
 
+import asyncio
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
 import pytest
-from day4 import hash_for_key, find_lowest_matching_hash_for_key
+from day4 import (
+    hash_for_key,
+    find_lowest_matching_hash_for_key,
+    find_lowest_matching_hash_parallel,
+    _search_block,
+    find_lowest_matching_hashes_for_key,
+    find_lowest_matching_hash_resumable,
+    mine_many,
+    iter_matching_hashes,
+    find_lowest_matching_hash_async,
+)
 
 
 @pytest.mark.parametrize(
@@ -31,3 +46,245 @@ def test_find_lowest_matching_hash_for_key(test_value, expected):
     """
     actual = find_lowest_matching_hash_for_key(test_value)
     assert actual == expected
+
+
+@pytest.mark.parametrize(
+    "test_value, desired_hash_prefix, workers, block_size",
+    [("abcdef", "00000", 2, 50_000), ("pqrstuv", "0000", 3, 1_000), ("abc", "0", 4, 3)],
+)
+def test_find_lowest_matching_hash_parallel(
+    test_value, desired_hash_prefix, workers, block_size
+):
+    """
+    has to be exactly what the one at a time version finds
+    """
+    expected = find_lowest_matching_hash_for_key(test_value, desired_hash_prefix)
+    actual = find_lowest_matching_hash_parallel(
+        test_value, desired_hash_prefix, workers=workers, block_size=block_size
+    )
+    assert actual == expected
+
+
+def reference_search(the_base, desired_hash_prefix, start, stop):
+    for i in range(start, stop):
+        if hash_for_key(the_base + str(i)).startswith(desired_hash_prefix):
+            return i
+    return None
+
+
+@pytest.mark.parametrize(
+    "desired_hash_prefix, start, stop",
+    [
+        ("000", 0, 20_000),
+        ("0000", 0, 20_000),
+        ("a", 0, 100),
+        ("ab", 0, 1_000),
+        ("abc", 0, 20_000),
+        ("00", 995, 1_003),
+        ("0", 1_999, 2_001),
+        ("00", 12_345, 12_999),
+        ("ffff", 0, 5_000),
+        ("", 7, 9),
+        ("ABC", 0, 100),
+        ("xyz", 0, 100),
+    ],
+)
+def test_search_block_matches_hex_digest(desired_hash_prefix, start, stop):
+    """
+    the raw digest checks have to agree with comparing the hex digest, odd length prefixes included
+    """
+    expected = reference_search("abcdef", desired_hash_prefix, start, stop)
+    actual = _search_block("abcdef", desired_hash_prefix, start, stop)
+    assert actual == expected
+
+
+@pytest.mark.parametrize(
+    "desired_hash_prefixes",
+    [["0000", "000"], ["000", "0000", "00"], ["abc", "0000", "a"], ["0"]],
+)
+def test_find_lowest_matching_hashes_for_key(desired_hash_prefixes):
+    """
+    one pass has to find the same answers as one search per prefix
+    """
+    actual = find_lowest_matching_hashes_for_key("abcdef", desired_hash_prefixes)
+    expected = {
+        prefix: reference_search("abcdef", prefix, 0, max(actual.values()) + 1)
+        for prefix in desired_hash_prefixes
+    }
+    assert actual == expected
+
+
+def test_find_lowest_matching_hashes_for_key_nothing_to_find():
+    assert find_lowest_matching_hashes_for_key("abcdef", []) == dict()
+
+
+def test_find_lowest_matching_hash_resumable(tmp_path):
+    state_file = str(tmp_path / "search.json")
+    expected = find_lowest_matching_hash_for_key("abcdef", "0000")
+
+    # run part of the way then pretend we got interrupted
+    checkpoints = []
+
+    def interrupt(searched, hashes_per_second, eta):
+        checkpoints.append((searched, eta))
+        if searched >= 20_000:
+            raise KeyboardInterrupt()
+
+    with pytest.raises(KeyboardInterrupt):
+        find_lowest_matching_hash_resumable(
+            "abcdef", "0000", state_file, checkpoint_every=10_000, progress=interrupt
+        )
+    assert [searched for searched, _ in checkpoints] == [10_000, 20_000]
+    assert all(eta >= 0 for _, eta in checkpoints)
+    with open(state_file) as f:
+        assert json.load(f)["searched_to"] == 20_000
+
+    # resuming must not look at anything below 20000 again
+    seen = []
+    actual = find_lowest_matching_hash_resumable(
+        "abcdef",
+        "0000",
+        state_file,
+        checkpoint_every=10_000,
+        progress=lambda searched, rate, eta: seen.append(searched),
+    )
+    assert actual == expected
+    assert seen == list(range(30_000, expected, 10_000))
+
+    # and once it's known, it's known
+    assert find_lowest_matching_hash_resumable("abcdef", "0000", state_file) == expected
+
+    # a different prefix starts from scratch
+    assert find_lowest_matching_hash_resumable(
+        "abcdef", "000", state_file
+    ) == find_lowest_matching_hash_for_key("abcdef", "000")
+
+
+def test_mine_many():
+    keys = ["abcdef", "pqrstuv", "abc", "iwrupvqb", "abc"]
+    prefixes = ["000", "0000"]
+    results = list(mine_many(keys, prefixes, workers=3, block_size=2_000))
+
+    # each key once, in whatever order they finished
+    assert sorted(key for key, _ in results) == sorted(set(keys))
+    for key, found in results:
+        assert found == find_lowest_matching_hashes_for_key(key, prefixes)
+
+
+def test_mine_many_no_prefixes():
+    results = list(mine_many(["abc", "abcdef"], [], workers=2))
+    assert sorted(results) == [("abc", {}), ("abcdef", {})]
+
+
+def test_mine_many_can_stop_early():
+    miner = mine_many(["abcdef", "abc"], ["00"], workers=2, block_size=10)
+    key, found = next(miner)
+    assert found == {"00": find_lowest_matching_hash_for_key(key, "00")}
+    miner.close()
+
+
+@pytest.mark.parametrize(
+    "desired_hash_prefix, lo, hi, workers, chunk_size",
+    [
+        ("000", 0, 30_000, 1, 7_000),
+        ("000", 0, 30_000, 3, 1_000),
+        ("abc", 990, 20_010, 2, 333),
+        ("0", 5, 5, 2, 10),
+    ],
+)
+def test_iter_matching_hashes(desired_hash_prefix, lo, hi, workers, chunk_size):
+    expected = [
+        (i, hash_for_key("abcdef" + str(i)))
+        for i in range(lo, hi)
+        if hash_for_key("abcdef" + str(i)).startswith(desired_hash_prefix)
+    ]
+    actual = list(
+        iter_matching_hashes(
+            "abcdef",
+            desired_hash_prefix,
+            lo,
+            hi,
+            workers=workers,
+            chunk_size=chunk_size,
+        )
+    )
+    assert actual == expected
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_iter_matching_hashes_cancel(workers):
+    cancel = threading.Event()
+    seen = []
+    for i, _ in iter_matching_hashes(
+        "abcdef", "00", 0, 10**9, workers=workers, chunk_size=500, cancel=cancel
+    ):
+        seen.append(i)
+        if len(seen) == 3:
+            cancel.set()
+    # the chunks already out there are allowed to finish
+    assert 3 <= len(seen) < 100
+    assert seen == sorted(seen)
+
+
+@pytest.fixture
+def process_pool():
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+
+@pytest.mark.parametrize(
+    "desired_hash_prefix, block_size",
+    [("000", 1_000), ("0000", 7_777), ("abc", 500)],
+)
+def test_find_lowest_matching_hash_async(process_pool, desired_hash_prefix, block_size):
+    expected = find_lowest_matching_hash_for_key("abcdef", desired_hash_prefix)
+    seen = []
+    actual = asyncio.run(
+        find_lowest_matching_hash_async(
+            "abcdef",
+            desired_hash_prefix,
+            pool=process_pool,
+            workers=2,
+            block_size=block_size,
+            progress=seen.append,
+        )
+    )
+    assert actual == expected
+    assert seen == sorted(seen)
+    assert seen[-1] > expected
+
+
+def test_find_lowest_matching_hash_async_concurrent(process_pool):
+    async def both():
+        return await asyncio.gather(
+            find_lowest_matching_hash_async(
+                "abcdef", "0000", pool=process_pool, workers=2, block_size=2_000
+            ),
+            find_lowest_matching_hash_async(
+                "pqrstuv", "000", pool=process_pool, workers=2, block_size=2_000
+            ),
+        )
+
+    assert asyncio.run(both()) == [
+        find_lowest_matching_hash_for_key("abcdef", "0000"),
+        find_lowest_matching_hash_for_key("pqrstuv", "000"),
+    ]
+
+
+def test_find_lowest_matching_hash_async_timeout(process_pool):
+    async def too_slow():
+        await asyncio.wait_for(
+            find_lowest_matching_hash_async(
+                "abcdef", "0000000000", pool=process_pool, workers=2, block_size=2_000
+            ),
+            timeout=0.3,
+        )
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(too_slow())
+    # the pool is still good for the next caller
+    assert asyncio.run(
+        find_lowest_matching_hash_async(
+            "abcdef", "000", pool=process_pool, workers=2, block_size=2_000
+        )
+    ) == find_lowest_matching_hash_for_key("abcdef", "000")
@@ -36,10 +36,58 @@
 # turn on 0,0 through 0,0 would increase the total brightness by 1.
 # toggle 0,0 through 999,999 would increase the total brightness by 2000000.
 
-from typing import Tuple, Union
+import hashlib
+import os
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Optional, Tuple, Union
 
+try:
+    import numpy as np
+except ImportError:
+    # only the array backed grids need numpy, the original set/dict grids work without it,
+    # parse_instructions() hands back a list of tuples instead of an array
+    np = None
 
-class BrightGrid:
+if np is not None:
+    INSTRUCTION_DTYPE = np.dtype(
+        [("op", "u1"), ("x1", "i8"), ("y1", "i8"), ("x2", "i8"), ("y2", "i8")]
+    )
+
+
+# opcodes for pre-parsed instructions, ACTIONS[opcode] is the grid method that carries it out
+TURN_ON = 0
+TURN_OFF = 1
+TOGGLE = 2
+ACTIONS = ("turn_on", "turn_off", "toggle")
+OPCODES = {"turn on": TURN_ON, "turn off": TURN_OFF, "toggle": TOGGLE}
+
+INSTRUCTION_PATTERN = re.compile(
+    r"^[ \t]*(turn on|turn off|toggle)[ \t]+(-?\d+),(-?\d+)[ \t]+through[ \t]+(-?\d+),(-?\d+)[ \t]*\r?$",
+    re.MULTILINE,
+)
+
+
+class _Grid:
+    """
+    Behaviour shared by every grid engine
+    """
+
+    def apply_batch(self, instructions):
+        """
+        Apply pre-parsed (opcode, x1, y1, x2, y2) instructions in order, as returned by parse_instructions()
+        """
+        if hasattr(instructions, "tolist"):
+            # a structured array, tolist() hands back plain python tuples which are much quicker to unpack
+            instructions = instructions.tolist()
+        actions = [getattr(self, name) for name in ACTIONS]
+        for op, x1, y1, x2, y2 in instructions:
+            actions[op](x1, y1, x2, y2)
+
+
+class BrightGrid(_Grid):
     def __init__(self):
         # all the lights that are currently lit
         self.lights = dict()
@@ -74,7 +122,8 @@ class BrightGrid:
         """
         return how many lights are lit
         """
-        return len(self.lights)
+        # lights that were dimmed back down to 0 are still in the dict, but they're not lit
+        return sum(1 for brightness in self.lights.values() if brightness > 0)
 
     def light_output(self):
         """
@@ -105,7 +154,7 @@ class BrightGrid:
         self.apply_grid(start_x, start_y, end_x, end_y, self.light_increase, 2)
 
 
-class LightGrid:
+class LightGrid(_Grid):
     def __init__(self):
         # all the lights that are currently lit
         self.lights = set()
@@ -170,6 +219,545 @@ class LightGrid:
         self.apply_grid(start_x, start_y, end_x, end_y, self.light_toggle)
 
 
+class _ArrayGrid(_Grid):
+    """
+    Shared storage for the array backed grids.
+    The lights live in a dense 2d array indexed [y, x], offset by origin_x / origin_y so
+    that the array can grow in any direction when an instruction reaches outside of it.
+    """
+
+    dtype = None
+
+    def __init__(self, width=1000, height=1000):
+        if np is None:
+            raise ImportError(f"{type(self).__name__} requires numpy")
+        self.origin_x = 0
+        self.origin_y = 0
+        self.lights = np.zeros((height, width), dtype=self.dtype)
+        # summed-area tables for region queries, built on demand and dropped by any change
+        self._count_table = None
+        self._brightness_table = None
+
+    def _grow_to(self, min_x, min_y, max_x, max_y):
+        """
+        Make sure the (inclusive) rectangle fits inside the array, copying into a bigger one if it doesn't
+        """
+        height, width = self.lights.shape
+        new_min_x = min(min_x, self.origin_x)
+        new_min_y = min(min_y, self.origin_y)
+        new_max_x = max(max_x, self.origin_x + width - 1)
+        new_max_y = max(max_y, self.origin_y + height - 1)
+        if (new_min_x, new_min_y) == (self.origin_x, self.origin_y) and (
+            new_max_x - new_min_x + 1,
+            new_max_y - new_min_y + 1,
+        ) == (width, height):
+            # already big enough
+            return
+
+        bigger = np.zeros(
+            (new_max_y - new_min_y + 1, new_max_x - new_min_x + 1),
+            dtype=self.lights.dtype,
+        )
+        off_x = self.origin_x - new_min_x
+        off_y = self.origin_y - new_min_y
+        bigger[off_y : off_y + height, off_x : off_x + width] = self.lights
+        self.lights = bigger
+        self.origin_x = new_min_x
+        self.origin_y = new_min_y
+
+    def _region(self, start_x, start_y, end_x, end_y):
+        """
+        Return a writable view of the passed field (inclusive), growing the grid first if needed
+        """
+        min_x, max_x = min(start_x, end_x), max(start_x, end_x)
+        min_y, max_y = min(start_y, end_y), max(start_y, end_y)
+        self._grow_to(min_x, min_y, max_x, max_y)
+        # the caller is about to change these lights
+        self._count_table = None
+        self._brightness_table = None
+        return self.lights[
+            min_y - self.origin_y : max_y - self.origin_y + 1,
+            min_x - self.origin_x : max_x - self.origin_x + 1,
+        ]
+
+    def lit_count(self):
+        """
+        return how many lights are lit
+        """
+        return int(np.count_nonzero(self.lights))
+
+    def light_output(self):
+        """
+        return the total brightness of all bulbs
+        """
+        return int(self.lights.sum(dtype=np.int64))
+
+    @staticmethod
+    def _summed_area(values):
+        """
+        Return the 2d prefix sum of values with a row and column of zeros in front,
+        table[y, x] is the total of everything above and left of values[y, x]
+        """
+        height, width = values.shape
+        table = np.zeros((height + 1, width + 1), dtype=np.int64)
+        np.cumsum(values, axis=0, dtype=np.int64, out=table[1:, 1:])
+        np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+        return table
+
+    def _query(self, table, start_x, start_y, end_x, end_y):
+        """
+        Sum of the summed-area table over the passed field (inclusive), anything outside the grid counts as 0
+        """
+        height, width = self.lights.shape
+        x1 = max(min(start_x, end_x) - self.origin_x, 0)
+        y1 = max(min(start_y, end_y) - self.origin_y, 0)
+        x2 = min(max(start_x, end_x) - self.origin_x, width - 1)
+        y2 = min(max(start_y, end_y) - self.origin_y, height - 1)
+        if x1 > x2 or y1 > y2:
+            return 0
+        return int(
+            table[y2 + 1, x2 + 1]
+            - table[y1, x2 + 1]
+            - table[y2 + 1, x1]
+            + table[y1, x1]
+        )
+
+    def count_in(self, start_x, start_y, end_x, end_y):
+        """
+        return how many lights are lit in the specified locations
+        """
+        if self._count_table is None:
+            self._count_table = self._summed_area(self.lights != 0)
+        return self._query(self._count_table, start_x, start_y, end_x, end_y)
+
+    def brightness_in(self, start_x, start_y, end_x, end_y):
+        """
+        return the total brightness of the lights in the specified locations
+        """
+        if self._brightness_table is None:
+            self._brightness_table = self._summed_area(self.lights)
+        return self._query(self._brightness_table, start_x, start_y, end_x, end_y)
+
+    def snapshot(self) -> Tuple[int, int, Tuple[int, int], str, bytes]:
+        """
+        Return a compact copy of the current state, bool grids are packed to one bit per light
+        and everything is zlib compressed
+        """
+        if self.lights.dtype == np.bool_:
+            raw = np.packbits(self.lights).tobytes()
+        else:
+            raw = self.lights.tobytes()
+        return (
+            self.origin_x,
+            self.origin_y,
+            self.lights.shape,
+            self.lights.dtype.str,
+            zlib.compress(raw),
+        )
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """
+        Return a new grid holding the state captured by snapshot()
+        """
+        origin_x, origin_y, shape, dtype, data = snapshot
+        raw = zlib.decompress(data)
+        if np.dtype(dtype) == np.bool_:
+            count = shape[0] * shape[1]
+            lights = np.unpackbits(np.frombuffer(raw, dtype=np.uint8), count=count)
+            lights = lights.astype(np.bool_)
+        else:
+            lights = np.frombuffer(raw, dtype=dtype).copy()
+        return cls.from_array(lights.reshape(shape), origin_x, origin_y)
+
+    @classmethod
+    def from_array(cls, lights, origin_x=0, origin_y=0):
+        """
+        Return a new grid using lights (indexed [y, x]) as its state
+        """
+        grid = cls(0, 0)
+        grid.lights = lights
+        grid.origin_x = origin_x
+        grid.origin_y = origin_y
+        return grid
+
+
+class ArrayLightGrid(_ArrayGrid):
+    """
+    LightGrid with the lights held in a bool array, each instruction is a single slice operation
+    """
+
+    dtype = "bool"
+
+    def light_on(self, light_location):
+        """
+        This light is now on
+        """
+        x, y = light_location
+        self.turn_on(x, y, x, y)
+
+    def light_off(self, light_location):
+        """
+        This light is now off
+        """
+        x, y = light_location
+        self.turn_off(x, y, x, y)
+
+    def light_toggle(self, light_location):
+        """
+        Change the current state of this..
+        """
+        x, y = light_location
+        self.toggle(x, y, x, y)
+
+    def turn_on(self, start_x, start_y, end_x, end_y):
+        """
+        Turn on each light in the specified locations
+        """
+        self._region(start_x, start_y, end_x, end_y)[...] = True
+
+    def turn_off(self, start_x, start_y, end_x, end_y):
+        """
+        Turn off each light in the specified locations
+        """
+        self._region(start_x, start_y, end_x, end_y)[...] = False
+
+    def toggle(self, start_x, start_y, end_x, end_y):
+        """
+        Flip each light in the specified locations
+        """
+        region = self._region(start_x, start_y, end_x, end_y)
+        np.logical_not(region, out=region)
+
+
+class ArrayBrightGrid(_ArrayGrid):
+    """
+    BrightGrid with the brightness held in an integer array, each instruction is a single slice operation
+    lit_count() is the number of lights with a brightness above zero
+    The array starts out as uint8 and is widened before any increase that could overflow it,
+    ceiling is an upper bound on the brightest light which is kept up to date as we go.
+    """
+
+    dtype = "uint8"
+    dtypes = ("uint8", "uint16", "uint32", "uint64")
+
+    def __init__(self, width=1000, height=1000):
+        super().__init__(width, height)
+        self.ceiling = 0
+
+    @classmethod
+    def from_array(cls, lights, origin_x=0, origin_y=0):
+        grid = super().from_array(lights, origin_x, origin_y)
+        grid.ceiling = int(lights.max()) if lights.size else 0
+        return grid
+
+    def _make_room_for(self, amount):
+        """
+        Make sure every light can get amount brighter without overflowing the array
+        """
+        if self.ceiling + amount <= np.iinfo(self.lights.dtype).max:
+            return
+        # the bound may be loose, check the real thing before paying for a wider array
+        self.ceiling = int(self.lights.max()) if self.lights.size else 0
+        needed = self.ceiling + amount
+        if needed <= np.iinfo(self.lights.dtype).max:
+            return
+        for dtype in self.dtypes:
+            if needed <= np.iinfo(dtype).max:
+                self.lights = self.lights.astype(dtype)
+                self._count_table = None
+                self._brightness_table = None
+                return
+        raise OverflowError(f"Brightness {needed} will not fit in any of {self.dtypes}")
+
+    def apply_batch(self, instructions):
+        """
+        Widen the array once for the worst case of the whole batch, then apply it
+        """
+        if hasattr(instructions, "tolist"):
+            instructions = instructions.tolist()
+        increases = {TURN_ON: 1, TOGGLE: 2}
+        worst_case = sum(increases.get(op, 0) for op, *_ in instructions)
+        self._make_room_for(worst_case)
+        super().apply_batch(instructions)
+
+    def light_increase(self, light_location, amount=1):
+        """
+        This light is now x brighter
+        """
+        x, y = light_location
+        self._increase(x, y, x, y, amount)
+
+    def light_decrease(self, light_location, amount=1):
+        """
+        This light is now x dimmer
+        """
+        x, y = light_location
+        self._decrease(x, y, x, y, amount)
+
+    def _increase(self, start_x, start_y, end_x, end_y, amount):
+        self._make_room_for(amount)
+        region = self._region(start_x, start_y, end_x, end_y)
+        region += amount
+        self.ceiling += amount
+
+    def _decrease(self, start_x, start_y, end_x, end_y, amount):
+        # clamp at zero, written so that it also works for unsigned arrays
+        region = self._region(start_x, start_y, end_x, end_y)
+        np.maximum(region, amount, out=region)
+        region -= amount
+
+    def turn_on(self, start_x, start_y, end_x, end_y):
+        """
+        Turn up each light in the specified locations
+        """
+        self._increase(start_x, start_y, end_x, end_y, 1)
+
+    def turn_off(self, start_x, start_y, end_x, end_y):
+        """
+        Turn down each light in the specified locations
+        """
+        self._decrease(start_x, start_y, end_x, end_y, 1)
+
+    def toggle(self, start_x, start_y, end_x, end_y):
+        """
+        Turn up each light in the specified locations by 2
+        """
+        self._increase(start_x, start_y, end_x, end_y, 2)
+
+
+class _CompressedGrid(_Grid):
+    """
+    Grid that never touches individual lights.
+    Instructions are only recorded as they arrive, the first lit_count() / light_output() call
+    compresses the x and y boundaries of every rectangle into elementary cells, replays the
+    instructions over those cells with an array grid and then weights each cell by its area.
+    Cost depends on the number of instructions, not on the size of the grid.
+    """
+
+    array_type = None
+
+    def __init__(self):
+        # (action name, min_x, min_y, max_x, max_y) in the order they were given
+        self.instructions = []
+        self._resolved = None
+
+    def _record(self, action, start_x, start_y, end_x, end_y):
+        self.instructions.append(
+            (
+                action,
+                min(start_x, end_x),
+                min(start_y, end_y),
+                max(start_x, end_x),
+                max(start_y, end_y),
+            )
+        )
+        self._resolved = None
+
+    def _resolve(self):
+        """
+        Return the compressed cell values and the area of each cell, both indexed [y, x]
+        """
+        if self._resolved is None:
+            # every rectangle starts a cell at its first light and ends one just after its last
+            xs = sorted(
+                {x1 for _, x1, _, _, _ in self.instructions}
+                | {x2 + 1 for _, _, _, x2, _ in self.instructions}
+            )
+            ys = sorted(
+                {y1 for _, _, y1, _, _ in self.instructions}
+                | {y2 + 1 for _, _, _, _, y2 in self.instructions}
+            )
+            x_index = {x: idx for idx, x in enumerate(xs)}
+            y_index = {y: idx for idx, y in enumerate(ys)}
+
+            cells = self.array_type(max(len(xs) - 1, 0), max(len(ys) - 1, 0))
+            for action, x1, y1, x2, y2 in self.instructions:
+                getattr(cells, action)(
+                    x_index[x1], y_index[y1], x_index[x2 + 1] - 1, y_index[y2 + 1] - 1
+                )
+
+            area = np.outer(
+                np.diff(np.array(ys, dtype=np.int64)),
+                np.diff(np.array(xs, dtype=np.int64)),
+            )
+            self._resolved = cells.lights, area
+        return self._resolved
+
+    def lit_count(self):
+        """
+        return how many lights are lit
+        """
+        cells, area = self._resolve()
+        return int(area[cells != 0].sum())
+
+    def light_output(self):
+        """
+        return the total brightness of all bulbs
+        """
+        cells, area = self._resolve()
+        return int((cells.astype(np.int64) * area).sum())
+
+    def turn_on(self, start_x, start_y, end_x, end_y):
+        """
+        Turn on each light in the specified locations
+        """
+        self._record("turn_on", start_x, start_y, end_x, end_y)
+
+    def turn_off(self, start_x, start_y, end_x, end_y):
+        """
+        Turn off each light in the specified locations
+        """
+        self._record("turn_off", start_x, start_y, end_x, end_y)
+
+    def toggle(self, start_x, start_y, end_x, end_y):
+        """
+        Toggle each light in the specified locations
+        """
+        self._record("toggle", start_x, start_y, end_x, end_y)
+
+
+class CompressedLightGrid(_CompressedGrid):
+    """
+    LightGrid semantics over compressed cells
+    """
+
+    array_type = ArrayLightGrid
+
+
+class CompressedBrightGrid(_CompressedGrid):
+    """
+    BrightGrid semantics over compressed cells
+    """
+
+    array_type = ArrayBrightGrid
+
+
+class BitsetLightGrid(_Grid):
+    """
+    LightGrid storing each row of lights as the bits of one python int, no numpy required.
+    Bit n of a row is the light at x = origin_x + n, origin_x moves down if a negative x turns up.
+    """
+
+    def __init__(self):
+        # row y -> int bitmap of the lights that are lit on that row
+        self.rows = dict()
+        self.origin_x = 0
+
+    def _span_mask(self, start_x, end_x):
+        """
+        Return the bitmask covering start_x to end_x (inclusive), shifting every row if start_x is below origin_x
+        """
+        min_x, max_x = min(start_x, end_x), max(start_x, end_x)
+        if min_x < self.origin_x:
+            shift = self.origin_x - min_x
+            for y in self.rows:
+                self.rows[y] <<= shift
+            self.origin_x = min_x
+        return ((1 << (max_x - min_x + 1)) - 1) << (min_x - self.origin_x)
+
+    @staticmethod
+    def _row_range(start_y, end_y):
+        return range(min(start_y, end_y), max(start_y, end_y) + 1)
+
+    def lit_count(self):
+        """
+        return how many lights are lit
+        """
+        # bin().count() rather than int.bit_count(), which needs python 3.10
+        return sum(bin(row).count("1") for row in self.rows.values())
+
+    def turn_on(self, start_x, start_y, end_x, end_y):
+        """
+        Turn on each light in the specified locations
+        """
+        mask = self._span_mask(start_x, end_x)
+        rows = self.rows
+        for y in self._row_range(start_y, end_y):
+            rows[y] = rows.get(y, 0) | mask
+
+    def turn_off(self, start_x, start_y, end_x, end_y):
+        """
+        Turn off each light in the specified locations
+        """
+        mask = ~self._span_mask(start_x, end_x)
+        rows = self.rows
+        for y in self._row_range(start_y, end_y):
+            if y in rows:
+                rows[y] &= mask
+
+    def toggle(self, start_x, start_y, end_x, end_y):
+        """
+        Flip each light in the specified locations
+        """
+        mask = self._span_mask(start_x, end_x)
+        rows = self.rows
+        for y in self._row_range(start_y, end_y):
+            rows[y] = rows.get(y, 0) ^ mask
+
+
+class GridTimeline:
+    """
+    Replay a list of instructions once, keeping a compressed snapshot of an array grid every
+    checkpoint_every instructions, so that the grid after any step can be rebuilt from the
+    nearest checkpoint with fewer than checkpoint_every instructions replayed.
+    Pass memory_budget (bytes) instead of checkpoint_every to space the checkpoints so that
+    even uncompressed snapshots of a standard grid would fit in the budget.
+    """
+
+    def __init__(
+        self,
+        grid_type,
+        instructions,
+        checkpoint_every: Optional[int] = None,
+        memory_budget: Optional[int] = None,
+    ):
+        if hasattr(instructions, "tolist"):
+            instructions = instructions.tolist()
+        self.grid_type = grid_type
+        self.instructions = instructions
+
+        if checkpoint_every is None:
+            if memory_budget is None:
+                raise ValueError("Need either checkpoint_every or memory_budget")
+            snapshot_size = grid_type().lights.nbytes
+            if grid_type.dtype == "bool":
+                snapshot_size = -(-snapshot_size // 8)
+            checkpoints = memory_budget // snapshot_size
+            if checkpoints < 2:
+                # only room for the starting state
+                checkpoint_every = len(instructions) + 1
+            else:
+                checkpoint_every = -(-len(instructions) // (checkpoints - 1))
+        self.checkpoint_every = max(1, checkpoint_every)
+
+        # checkpoints[n] is the state after n * checkpoint_every instructions
+        grid = grid_type()
+        self.checkpoints = [grid.snapshot()]
+        for step in range(
+            self.checkpoint_every, len(instructions) + 1, self.checkpoint_every
+        ):
+            grid.apply_batch(instructions[step - self.checkpoint_every : step])
+            self.checkpoints.append(grid.snapshot())
+
+    def memory_used(self) -> int:
+        """
+        return the number of compressed bytes held in checkpoints
+        """
+        return sum(len(data) for *_, data in self.checkpoints)
+
+    def state_at(self, step: int):
+        """
+        Return the grid as it was after the first step instructions
+        """
+        if not 0 <= step <= len(self.instructions):
+            raise IndexError(f"No step {step}, there are {len(self.instructions)}")
+        nearest = step // self.checkpoint_every
+        grid = self.grid_type.from_snapshot(self.checkpoints[nearest])
+        grid.apply_batch(self.instructions[nearest * self.checkpoint_every : step])
+        return grid
+
+
 def range_split(s: str) -> Tuple[int, int]:
     """
     takes a string 123,456 and return a tuple 123, 456 as ints
@@ -180,9 +768,9 @@ def range_split(s: str) -> Tuple[int, int]:
     return a, b
 
 
-def apply_one_line_to_grid(grid: Union[LightGrid, BrightGrid], instruction: str):
+def parse_instruction(instruction: str) -> Tuple[str, int, int, int, int]:
     """
-    Apply a single instruction to the X-Grid
+    Turn a single instruction into the name of the grid method to call and its coordinates
     instruction must be one of:
     turn on 1,2 through 3,4
     turn off 1,2 through 3,4
@@ -198,15 +786,68 @@ def apply_one_line_to_grid(grid: Union[LightGrid, BrightGrid], instruction: str)
     x2, y2 = range_split(range2)
     # print(f"words: {words}, -> {range1},{range2} -> {x1}-{y1}-{x2}-{y2}")
 
-    # now figure out which instruction we're dealing with and apply the command
+    # now figure out which instruction we're dealing with
     if instruction.startswith("turn on"):
-        grid.turn_on(x1, y1, x2, y2)
+        action = "turn_on"
     elif instruction.startswith("turn off"):
-        grid.turn_off(x1, y1, x2, y2)
+        action = "turn_off"
     elif instruction.startswith("toggle"):
-        grid.toggle(x1, y1, x2, y2)
+        action = "toggle"
     else:
         raise ValueError(f"What the hell kind of command is {instruction} ?")
+    return action, x1, y1, x2, y2
+
+
+def apply_one_line_to_grid(grid: Union[LightGrid, BrightGrid], instruction: str):
+    """
+    Apply a single instruction to the X-Grid
+    """
+    action, x1, y1, x2, y2 = parse_instruction(instruction)
+    getattr(grid, action)(x1, y1, x2, y2)
+
+
+def parse_instructions(filename: str):
+    """
+    Parse a whole instruction file in one pass into a structured array of (op, x1, y1, x2, y2)
+    (a list of tuples without numpy) which can be handed to apply_batch() on any grid as many
+    times as needed
+    """
+    with open(filename, "r") as f:
+        return parse_instruction_text(f.read())
+
+
+def parse_instruction_text(text: str):
+    """
+    Parse a block of instruction lines into a structured array of (op, x1, y1, x2, y2),
+    or a list of those tuples if numpy isn't available
+    """
+    matches = INSTRUCTION_PATTERN.findall(text)
+    lines = [this_line for this_line in text.splitlines() if "" != this_line.strip()]
+    if len(matches) != len(lines):
+        # something is wrong, name the culprit if there's a single line to blame
+        for this_line in lines:
+            if INSTRUCTION_PATTERN.match(this_line) is None:
+                raise ValueError(f"What the hell kind of command is {this_line} ?")
+        # every line is fine on its own, the line endings aren't (a bare \r, say)
+        raise ValueError(
+            f"Only {len(matches)} of the {len(lines)} lines could be read as commands"
+        )
+
+    if np is None:
+        return [
+            (OPCODES[this_match[0]], *(int(v) for v in this_match[1:]))
+            for this_match in matches
+        ]
+
+    instructions = np.zeros(len(matches), dtype=INSTRUCTION_DTYPE)
+    if matches:
+        instructions["op"] = [OPCODES[this_match[0]] for this_match in matches]
+        coordinates = np.array([this_match[1:] for this_match in matches]).astype(
+            np.int64
+        )
+        for idx, field in enumerate(("x1", "y1", "x2", "y2")):
+            instructions[field] = coordinates[:, idx]
+    return instructions
 
 
 def grid_from_file(filename: str, grid_type):
@@ -225,14 +866,166 @@ def grid_from_file(filename: str, grid_type):
     return the_grid
 
 
+def grid_from_file_incremental(
+    filename: str, grid_type, state_filename: Optional[str] = None
+):
+    """
+    Return an array grid configured per the instructions in an append-only file.
+    The grid after the last complete line is saved to state_filename together with the
+    byte offset and sha256 of the lines consumed so far, the next call only replays the lines
+    appended since. If the consumed part of the file has changed it replays from scratch.
+    """
+    if state_filename is None:
+        state_filename = f"{filename}.{grid_type.__name__}.npz"
+
+    with open(filename, "rb") as f:
+        data = f.read()
+
+    grid = None
+    start = 0
+    if os.path.exists(state_filename):
+        with np.load(state_filename) as state:
+            offset = int(state["offset"])
+            if (
+                str(state["grid_type"]) == grid_type.__name__
+                and offset <= len(data)
+                and str(state["sha256"]) == hashlib.sha256(data[:offset]).hexdigest()
+            ):
+                grid = grid_type.from_array(
+                    state["lights"], int(state["origin_x"]), int(state["origin_y"])
+                )
+                start = offset
+    if grid is None:
+        grid = grid_type()
+
+    # only whole lines make it into the saved state, a half written last line might still grow
+    consumed = data.rfind(b"\n") + 1
+    if consumed > start:
+        grid.apply_batch(parse_instruction_text(data[start:consumed].decode()))
+    if consumed > start or 0 == start:
+        temp_filename = f"{state_filename}.tmp.npz"
+        np.savez(
+            temp_filename,
+            lights=grid.lights,
+            origin_x=grid.origin_x,
+            origin_y=grid.origin_y,
+            offset=consumed,
+            sha256=hashlib.sha256(data[:consumed]).hexdigest(),
+            grid_type=grid_type.__name__,
+        )
+        os.replace(temp_filename, state_filename)
+
+    if len(data) > consumed:
+        grid.apply_batch(parse_instruction_text(data[consumed:].decode()))
+    return grid
+
+
+class BandedGrid:
+    """
+    The combined lit count and brightness of a grid that was replayed in horizontal bands
+    """
+
+    def __init__(self, lit: int, output: int):
+        self.lit = lit
+        self.output = output
+
+    def lit_count(self):
+        """
+        return how many lights are lit
+        """
+        return self.lit
+
+    def light_output(self):
+        """
+        return the total brightness of all bulbs
+        """
+        return self.output
+
+
+def _band_grid(grid_type, instructions, band_start_y, band_end_y):
+    """
+    Return a grid_type grid with every instruction replayed clipped to the rows band_start_y to band_end_y (inclusive)
+    """
+    start_y = np.minimum(instructions["y1"], instructions["y2"])
+    end_y = np.maximum(instructions["y1"], instructions["y2"])
+    in_band = (end_y >= band_start_y) & (start_y <= band_end_y)
+    clipped = instructions[in_band]
+    clipped["y1"] = np.maximum(start_y[in_band], band_start_y)
+    clipped["y2"] = np.minimum(end_y[in_band], band_end_y)
+
+    if issubclass(grid_type, _ArrayGrid):
+        # the default grid starts at (0,0) and would grow to cover every row above the band as well,
+        # so size it to just the band and the x range the instructions use
+        min_x = int(np.minimum(instructions["x1"], instructions["x2"]).min())
+        max_x = int(np.maximum(instructions["x1"], instructions["x2"]).max())
+        lights = np.zeros(
+            (band_end_y - band_start_y + 1, max_x - min_x + 1), dtype=grid_type.dtype
+        )
+        grid = grid_type.from_array(lights, origin_x=min_x, origin_y=band_start_y)
+    else:
+        grid = grid_type()
+    grid.apply_batch(clipped)
+    return grid
+
+
+def _replay_band(grid_type, instructions, band_start_y, band_end_y) -> Tuple[int, int]:
+    """
+    Replay every instruction clipped to the rows band_start_y to band_end_y (inclusive)
+    and return the lit count and brightness of the band
+    """
+    grid = _band_grid(grid_type, instructions, band_start_y, band_end_y)
+    lit = grid.lit_count()
+    # plain on/off grids have no brightness, each lit light counts as 1
+    output = grid.light_output() if hasattr(grid, "light_output") else lit
+    return lit, output
+
+
+def grid_from_file_banded(
+    filename: str, grid_type, workers: Optional[int] = None
+) -> BandedGrid:
+    """
+    Replay the file split into one horizontal band per worker process, each worker runs every
+    instruction clipped to its own rows so the bands never interact
+    """
+    instructions = parse_instructions(filename)
+    if 0 == len(instructions):
+        return BandedGrid(0, 0)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    min_y = int(np.minimum(instructions["y1"], instructions["y2"]).min())
+    max_y = int(np.maximum(instructions["y1"], instructions["y2"]).max())
+    band_height = -(-(max_y - min_y + 1) // workers)
+    band_starts = list(range(min_y, max_y + 1, band_height))
+    band_ends = [start + band_height - 1 for start in band_starts]
+
+    with ProcessPoolExecutor(max_workers=len(band_starts)) as pool:
+        results = list(
+            pool.map(
+                _replay_band,
+                repeat(grid_type),
+                repeat(instructions),
+                band_starts,
+                band_ends,
+            )
+        )
+
+    return BandedGrid(
+        sum(lit for lit, _ in results), sum(output for _, output in results)
+    )
+
+
 def main():
     print(f"2015 day_6")
     filename = "input.txt"
-    grid = grid_from_file(filename, LightGrid)
+    instructions = parse_instructions(filename)
+    grid = LightGrid()
+    grid.apply_batch(instructions)
     print(f"part 1: {grid.lit_count()}")
-    grid2 = grid_from_file(filename, BrightGrid)
+    grid2 = BrightGrid()
+    grid2.apply_batch(instructions)
     print(f"part 2: {grid2.light_output()}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
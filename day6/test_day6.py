@@ -1,5 +1,32 @@
+import os
+
+import numpy as np
 import pytest
-from day6 import LightGrid, range_split
+
+import day6
+from day6 import (
+    LightGrid,
+    BrightGrid,
+    ArrayLightGrid,
+    ArrayBrightGrid,
+    CompressedLightGrid,
+    CompressedBrightGrid,
+    BitsetLightGrid,
+    range_split,
+    apply_one_line_to_grid,
+    grid_from_file,
+    grid_from_file_banded,
+    _band_grid,
+    parse_instruction_text,
+    parse_instruction,
+    parse_instructions,
+    ACTIONS,
+    TOGGLE,
+    GridTimeline,
+    grid_from_file_incremental,
+)
+
+INPUT_FILE = os.path.join(os.path.dirname(__file__), "input.txt")
 
 
 @pytest.mark.parametrize(
@@ -45,3 +72,357 @@ def test_LightGrid_off_without_on():
     lg = LightGrid()
     lg.turn_off(0, 0, 1, 1)
     assert 0 == lg.lit_count()
+
+
+@pytest.mark.parametrize(
+    "grid_to_light, grid_to_turn_off, grid_to_toggle, expected_light_count",
+    [
+        ((0, 0, 1, 1), None, None, 4),
+        (None, None, (0, 0, 1, 1), 4),
+        ((0, 0, 1, 1), None, (-2, -2, 2, 2), 21),
+        ((0, 0, 1, 1), (0, 0, 0, 1), None, 2),
+        ((998, 998, 1001, 1001), None, None, 16),
+    ],
+)
+def test_ArrayLightGrid(
+    grid_to_light, grid_to_turn_off, grid_to_toggle, expected_light_count
+):
+    """
+    the array grid has to grow for anything outside 0-999
+    """
+    lg = ArrayLightGrid()
+    if grid_to_light is not None:
+        lg.turn_on(*grid_to_light)
+    if grid_to_turn_off is not None:
+        lg.turn_off(*grid_to_turn_off)
+    if grid_to_toggle is not None:
+        lg.toggle(*grid_to_toggle)
+
+    actual = lg.lit_count()
+    assert actual == expected_light_count
+
+
+def test_ArrayBrightGrid_clamps_at_zero():
+    bg = ArrayBrightGrid()
+    bg.turn_on(0, 0, 0, 0)
+    bg.turn_off(0, 0, 1, 1)
+    bg.turn_off(0, 0, 1, 1)
+    bg.toggle(-1, -1, 0, 0)
+    assert bg.light_output() == 8
+    assert bg.lit_count() == 4
+
+
+def test_BrightGrid_lit_count_ignores_dimmed_lights():
+    bg = BrightGrid()
+    bg.turn_on(0, 0, 2, 2)
+    bg.turn_off(0, 0, 0, 2)
+    assert bg.lit_count() == 6
+    assert bg.light_output() == 6
+
+
+@pytest.mark.parametrize(
+    "reference_type, array_type",
+    [
+        (LightGrid, ArrayLightGrid),
+        (BrightGrid, ArrayBrightGrid),
+        (LightGrid, CompressedLightGrid),
+        (BrightGrid, CompressedBrightGrid),
+        (LightGrid, BitsetLightGrid),
+    ],
+)
+def test_grids_match_originals(reference_type, array_type):
+    """
+    replay the start of the puzzle input with both engines and compare
+    """
+    lines = open(INPUT_FILE).read().splitlines()[:20]
+    reference = reference_type()
+    array_grid = array_type()
+    for this_line in lines:
+        apply_one_line_to_grid(reference, this_line)
+        apply_one_line_to_grid(array_grid, this_line)
+
+    assert array_grid.lit_count() == reference.lit_count()
+    if reference_type is BrightGrid:
+        assert array_grid.light_output() == reference.light_output()
+
+
+def test_compressed_grids_on_a_huge_grid():
+    """
+    a million by a million grid is fine as long as there are only a few rectangles
+    """
+    lg = CompressedLightGrid()
+    bg = CompressedBrightGrid()
+    for grid in (lg, bg):
+        grid.turn_on(0, 0, 999_999, 999_999)
+        grid.toggle(0, 0, 999_999, 0)
+        grid.turn_off(499_999, 499_999, 500_000, 500_000)
+        grid.turn_off(499_999, 499_999, 500_000, 500_000)
+
+    assert lg.lit_count() == 10**12 - 10**6 - 4
+    assert bg.light_output() == 10**12 + 2 * 10**6 - 4
+    assert bg.lit_count() == 10**12 - 4
+
+
+def test_compressed_grid_without_instructions():
+    assert CompressedLightGrid().lit_count() == 0
+    assert CompressedBrightGrid().light_output() == 0
+
+
+@pytest.mark.parametrize(
+    "grid_to_light, grid_to_turn_off, grid_to_toggle, expected_light_count",
+    [
+        ((0, 0, 1, 1), None, None, 4),
+        (None, None, (0, 0, 1, 1), 4),
+        ((0, 0, 1, 1), None, (-2, -2, 2, 2), 21),
+        ((0, 0, 1, 1), (0, 0, 0, 1), None, 2),
+        (None, (0, 0, 1, 1), None, 0),
+    ],
+)
+def test_BitsetLightGrid(
+    grid_to_light, grid_to_turn_off, grid_to_toggle, expected_light_count
+):
+    lg = BitsetLightGrid()
+    if grid_to_light is not None:
+        lg.turn_on(*grid_to_light)
+    if grid_to_turn_off is not None:
+        lg.turn_off(*grid_to_turn_off)
+    if grid_to_toggle is not None:
+        lg.toggle(*grid_to_toggle)
+
+    actual = lg.lit_count()
+    assert actual == expected_light_count
+
+
+@pytest.mark.parametrize(
+    "grid_type, workers",
+    [(ArrayLightGrid, 3), (ArrayBrightGrid, 3), (BrightGrid, 2), (BitsetLightGrid, 4)],
+)
+def test_grid_from_file_banded(tmp_path, grid_type, workers):
+    """
+    the bands have to add up to the same answer as a single grid, including the clamp at zero
+    """
+    instructions = tmp_path / "instructions.txt"
+    instructions.write_text(
+        "turn on 0,0 through 9,9\n"
+        "turn off 2,2 through 7,7\n"
+        "turn off 2,2 through 7,7\n"
+        "toggle 5,5 through 12,3\n"
+        "\n"
+        "turn on 3,-4 through 4,20\n"
+    )
+    expected = grid_from_file(str(instructions), grid_type)
+    actual = grid_from_file_banded(str(instructions), grid_type, workers=workers)
+
+    assert actual.lit_count() == expected.lit_count()
+    if hasattr(expected, "light_output"):
+        assert actual.light_output() == expected.light_output()
+
+
+@pytest.mark.parametrize("grid_type", [ArrayLightGrid, ArrayBrightGrid])
+def test_band_grid_only_holds_its_band(grid_type):
+    """
+    a band at the far end of a tall grid mustn't grow to cover the rows above it
+    """
+    instructions = parse_instruction_text(
+        "turn on 10,0 through 19,99999\ntoggle 15,80000 through 12,80009\n"
+    )
+    grid = _band_grid(grid_type, instructions, 75000, 99999)
+
+    assert grid.lights.shape == (25000, 10)
+    assert (grid.origin_x, grid.origin_y) == (10, 75000)
+    expected = 25000 * 10 - 40 if grid_type is ArrayLightGrid else 25000 * 10
+    assert grid.lit_count() == expected
+
+
+def test_parse_instructions_matches_parse_instruction():
+    instructions = parse_instructions(INPUT_FILE)
+    lines = open(INPUT_FILE).read().splitlines()
+    assert len(instructions) == len(lines)
+    for (op, x1, y1, x2, y2), this_line in zip(instructions.tolist(), lines):
+        assert (ACTIONS[op], x1, y1, x2, y2) == parse_instruction(this_line)
+
+
+def test_parse_instructions_rejects_rubbish(tmp_path):
+    instructions = tmp_path / "instructions.txt"
+    instructions.write_text("turn on 0,0 through 1,1\nturn sideways 0,0 through 1,1\n")
+    with pytest.raises(ValueError):
+        parse_instructions(str(instructions))
+
+
+def test_parse_instruction_text_without_numpy(monkeypatch):
+    text = open(INPUT_FILE).read()
+    expected = parse_instruction_text(text).tolist()
+    monkeypatch.setattr(day6, "np", None)
+    actual = parse_instruction_text(text)
+    assert actual == expected
+
+    # the original grids take the list as it is
+    grid = BrightGrid()
+    grid.apply_batch(actual[:20])
+    reference = BrightGrid()
+    for this_line in text.splitlines()[:20]:
+        apply_one_line_to_grid(reference, this_line)
+    assert grid.light_output() == reference.light_output()
+
+
+def test_parse_instruction_text_rejects_bare_carriage_returns():
+    with pytest.raises(ValueError):
+        parse_instruction_text("turn on 0,0 through 1,1\rtoggle 0,0 through 2,2\r")
+
+
+@pytest.mark.parametrize(
+    "grid_type",
+    [
+        LightGrid,
+        BrightGrid,
+        ArrayLightGrid,
+        ArrayBrightGrid,
+        CompressedLightGrid,
+        CompressedBrightGrid,
+        BitsetLightGrid,
+    ],
+)
+def test_apply_batch(tmp_path, grid_type):
+    """
+    a batch has to land the same as applying the file line by line
+    """
+    instructions = tmp_path / "instructions.txt"
+    instructions.write_text(
+        "turn on 0,0 through 9,9\n"
+        "toggle 12,3 through 5,5\n"
+        "turn off -2,2 through 7,7\n"
+    )
+    expected = grid_from_file(str(instructions), grid_type)
+    actual = grid_type()
+    actual.apply_batch(parse_instructions(str(instructions)))
+
+    assert actual.lit_count() == expected.lit_count()
+    if hasattr(expected, "light_output"):
+        assert actual.light_output() == expected.light_output()
+
+
+@pytest.mark.parametrize("grid_type", [ArrayLightGrid, ArrayBrightGrid])
+@pytest.mark.parametrize(
+    "region",
+    [
+        (0, 0, 999, 999),
+        (0, 0, 0, 0),
+        (10, 20, 30, 40),
+        (999, 999, 0, 0),
+        (-50, -50, 5, 5),
+        (2000, 2000, 3000, 3000),
+    ],
+)
+def test_region_queries(grid_type, region):
+    grid = grid_type()
+    grid.apply_batch(parse_instructions(INPUT_FILE)[:40])
+    x1, x2 = sorted((region[0], region[2]))
+    y1, y2 = sorted((region[1], region[3]))
+    expected = grid.lights[max(y1, 0) : y2 + 1, max(x1, 0) : x2 + 1]
+
+    assert grid.count_in(*region) == int((expected != 0).sum())
+    assert grid.brightness_in(*region) == int(expected.sum())
+
+
+def test_region_queries_follow_changes():
+    grid = ArrayBrightGrid()
+    grid.turn_on(0, 0, 9, 9)
+    assert grid.brightness_in(0, 0, 4, 4) == 25
+    grid.toggle(0, 0, 1, 1)
+    assert grid.brightness_in(0, 0, 4, 4) == 33
+    grid.turn_off(-5, -5, 0, 0)
+    grid.turn_off(-5, -5, 0, 0)
+    assert grid.count_in(-5, -5, 4, 4) == 25
+    assert grid.brightness_in(-5, -5, 4, 4) == 31
+
+
+@pytest.mark.parametrize("grid_type", [ArrayLightGrid, ArrayBrightGrid])
+@pytest.mark.parametrize("checkpoint_every", [1, 7, 100])
+def test_GridTimeline(grid_type, checkpoint_every):
+    instructions = parse_instructions(INPUT_FILE)[:30]
+    timeline = GridTimeline(grid_type, instructions, checkpoint_every=checkpoint_every)
+    for step in (0, 1, 6, 7, 8, 29, 30):
+        expected = grid_type()
+        expected.apply_batch(instructions[:step])
+        actual = timeline.state_at(step)
+        assert actual.light_output() == expected.light_output()
+        assert (actual.lights == expected.lights).all()
+
+    with pytest.raises(IndexError):
+        timeline.state_at(31)
+
+
+def test_GridTimeline_memory_budget():
+    instructions = parse_instructions(INPUT_FILE)
+    # room for 10 packed 1000x1000 bitmaps
+    timeline = GridTimeline(ArrayLightGrid, instructions, memory_budget=10 * 125_000)
+    assert timeline.checkpoint_every == 34
+    assert len(timeline.checkpoints) == 9
+    assert timeline.memory_used() <= 10 * 125_000
+    expected = ArrayLightGrid()
+    expected.apply_batch(instructions[:123])
+    assert timeline.state_at(123).lit_count() == expected.lit_count()
+
+
+def test_snapshot_round_trip_after_growing():
+    grid = ArrayLightGrid()
+    grid.toggle(-3, -2, 1001, 5)
+    restored = ArrayLightGrid.from_snapshot(grid.snapshot())
+    assert (restored.origin_x, restored.origin_y) == (-3, -2)
+    assert (restored.lights == grid.lights).all()
+    assert restored.count_in(-3, -2, -3, -2) == 1
+
+
+@pytest.mark.parametrize("grid_type", [ArrayLightGrid, ArrayBrightGrid])
+def test_grid_from_file_incremental(tmp_path, grid_type):
+    lines = open(INPUT_FILE).read().splitlines(keepends=True)
+    instructions = tmp_path / "instructions.txt"
+    state = tmp_path / "instructions.state.npz"
+
+    def check(expected_offset):
+        actual = grid_from_file_incremental(str(instructions), grid_type, str(state))
+        expected = grid_from_file(str(instructions), grid_type)
+        assert actual.light_output() == expected.light_output()
+        with np.load(str(state)) as saved:
+            assert int(saved["offset"]) == expected_offset
+
+    instructions.write_text("".join(lines[:10]))
+    check(len("".join(lines[:10])))
+
+    # append some more, including half a line
+    instructions.write_text("".join(lines[:20]) + lines[20].rstrip())
+    check(len("".join(lines[:20])))
+
+    # rewrite history, the saved state has to be thrown away
+    instructions.write_text("".join(lines[5:25]))
+    check(len("".join(lines[5:25])))
+
+
+def test_ArrayBrightGrid_widens_before_overflow():
+    grid = ArrayBrightGrid()
+    assert grid.lights.dtype == np.uint8
+    for _ in range(127):
+        grid.toggle(0, 0, 1, 1)
+    grid.turn_on(0, 0, 0, 0)
+    assert grid.lights.dtype == np.uint8
+    assert grid.light_output() == 4 * 254 + 1
+
+    grid.turn_on(0, 0, 0, 0)
+    assert grid.lights.dtype == np.uint16
+    assert grid.light_output() == 4 * 254 + 2
+
+
+def test_ArrayBrightGrid_only_widens_when_it_has_to():
+    grid = ArrayBrightGrid()
+    for _ in range(300):
+        grid.turn_on(0, 0, 0, 0)
+        grid.turn_off(0, 0, 0, 0)
+    assert grid.lights.dtype == np.uint8
+    assert grid.light_output() == 0
+
+
+def test_ArrayBrightGrid_batch_widens_up_front():
+    grid = ArrayBrightGrid()
+    grid.apply_batch([(TOGGLE, 0, 0, 2, 2)] * 40_000)
+    assert grid.lights.dtype == np.uint32
+    assert grid.light_output() == 9 * 80_000
@@ -0,0 +1,46 @@
+#
+#  timings for the generated board function against LogicBoard.provide_for()
+#
+
+import tempfile
+import timeit
+
+from day7 import LogicBoard, function_for_file
+
+
+def load(filename: str) -> LogicBoard:
+    board = LogicBoard()
+    board.load_from_file(filename)
+    return board
+
+
+def main():
+    filename = "input.txt"
+    repeats = 200
+
+    board = load(filename)
+
+    def provide_for():
+        board.recalculate()
+        return board.provide_for("a")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # the first call parses the file and fills the cache, the second comes straight from it
+        cold = timeit.timeit(lambda: function_for_file(filename, cache_dir), number=1)
+        warm = timeit.timeit(lambda: function_for_file(filename, cache_dir), number=1)
+        evaluate = function_for_file(filename, cache_dir)
+    assert evaluate()["a"] == provide_for()
+
+    parse = timeit.timeit(lambda: load(filename), number=1)
+    print(f"load - parse the file: {parse * 1000:.2f}ms")
+    print(f"load - generated function, cold cache: {cold * 1000:.2f}ms")
+    print(f"load - generated function, warm cache: {warm * 1000:.2f}ms")
+
+    per_call = timeit.timeit(provide_for, number=repeats) / repeats
+    print(f"evaluate - provide_for: {per_call * 1_000_000:.1f}us")
+    per_call = timeit.timeit(evaluate, number=repeats) / repeats
+    print(f"evaluate - generated function: {per_call * 1_000_000:.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -64,7 +64,31 @@
 # Now, take the signal you got on wire a, override wire b to that signal, and reset the other wires (including wire a).
 # What new signal is ultimately provided to wire a?
 
-from typing import Union, Optional
+import hashlib
+import marshal
+import os
+import re
+import sys
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Union,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+try:
+    import numpy as np
+except ImportError:
+    # only the batch evaluator needs numpy
+    np = None
 
 
 def mask_to_bits(num_bits: int, the_value: int) -> int:
@@ -77,6 +101,9 @@ def mask_to_bits(num_bits: int, the_value: int) -> int:
 
 
 class LogicNode:
+    # no per-node __dict__, boards can hold millions of these
+    __slots__ = ("id", "node_type", "value1", "value2", "node_value")
+
     UNKNOWN = 42
     NOP = 1001
     AND = 1002
@@ -174,7 +201,13 @@ class LogicNode:
     def configure(self, node_type, value1, value2=None):
         """
         Allow ourselves to be configured to do something useful
+        Constant inputs are 16 bit signals like everything else, so anything wider is masked here
+        and every way of evaluating the board sees the same value
         """
+        if isinstance(value1, int):
+            value1 = mask_to_bits(16, value1)
+        if isinstance(value2, int):
+            value2 = mask_to_bits(16, value2)
         self.node_type = node_type
         self.value1 = value1
         self.value2 = value2
@@ -194,24 +227,26 @@ class LogicNode:
         if self.node_value is not None:
             return self.node_value
 
+        return self._evaluate(depth)
+
+    def _evaluate(self, depth: int) -> int:
+        """
+        Work out the output of this logic node from its inputs and remember it
+        """
         a = LogicNode._resolve_value(self.value1, depth)
         b = LogicNode._resolve_value(self.value2, depth)
+        return self._compute(a, b)
 
-        logic_operations = {
-            LogicNode.NOP: LogicNode._op_nop,
-            LogicNode.AND: LogicNode._op_and,
-            LogicNode.OR: LogicNode._op_or,
-            LogicNode.NOT: LogicNode._op_not,
-            LogicNode.LSHIFT: LogicNode._op_lshift,
-            LogicNode.RSHIFT: LogicNode._op_rshift,
-        }
-
+    def _compute(self, a: int, b: int) -> int:
+        """
+        Apply this node's operation to its input values and remember the result
+        """
         # get the operation
-        if self.node_type not in logic_operations:
+        if self.node_type not in LogicNode.OPERATIONS:
             raise RuntimeError(
                 f"Attempting to provide() on a node ({self.id}) of type {self.node_type} - not supported"
             )
-        the_operation = logic_operations[self.node_type]
+        the_operation = LogicNode.OPERATIONS[self.node_type]
 
         # call the operation providing the two values
         result = the_operation(a, b)
@@ -226,12 +261,344 @@ class LogicNode:
         return result
 
 
+# instruction keyword -> node type
+OP_VALUES = {
+    "NOP": LogicNode.NOP,
+    "OR": LogicNode.OR,
+    "NOT": LogicNode.NOT,
+    "AND": LogicNode.AND,
+    "LSHIFT": LogicNode.LSHIFT,
+    "RSHIFT": LogicNode.RSHIFT,
+}
+
+# one instruction per line, the groups are
+# a OP b -> target: (a, OP, b), NOT a -> target: (NOT, a), a -> target: (a), then target
+INSTRUCTION_PATTERN = re.compile(
+    r"^[ \t]*(?:(\w+)[ \t]+(AND|OR|LSHIFT|RSHIFT)[ \t]+(\w+)|(NOT)[ \t]+(\w+)|(\w+))"
+    r"[ \t]*->[ \t]*(\w+)[ \t]*\r?$",
+    re.MULTILINE,
+)
+
+# the function behind each node type, shared by provide() and the compiled boards
+LogicNode.OPERATIONS = {
+    LogicNode.NOP: LogicNode._op_nop,
+    LogicNode.AND: LogicNode._op_and,
+    LogicNode.OR: LogicNode._op_or,
+    LogicNode.NOT: LogicNode._op_not,
+    LogicNode.LSHIFT: LogicNode._op_lshift,
+    LogicNode.RSHIFT: LogicNode._op_rshift,
+}
+
+
+class ProvideProfile:
+    """
+    What provide() would have got up to while profiling was switched on, see LogicBoard.profile()
+    """
+
+    def __init__(self):
+        # node id -> number of times it actually had to be worked out
+        self.evaluations = Counter()
+        # provide() calls answered from node_value, and ones that weren't
+        self.hits = 0
+        self.misses = 0
+        self.max_depth = 0
+        # operator name -> seconds spent in nodes of that type, not counting their inputs
+        self.gate_time = defaultdict(float)
+
+    def _called(self, node: LogicNode, depth: int) -> bool:
+        """
+        count a provide() call on node, returns True if it was answered from node_value
+        """
+        self.max_depth = max(self.max_depth, depth)
+        if node.node_value is not None:
+            self.hits += 1
+            return True
+        self.misses += 1
+        self.evaluations[node.id] += 1
+        return False
+
+    def provide(self, node: LogicNode, depth: int = 1) -> int:
+        """
+        provide() for node, keeping count as we go
+        The inputs are visited in the same order as LogicNode.provide() would, but off an explicit
+        stack, so boards deeper than the recursion limit can be profiled as well
+        """
+        if self._called(node, depth):
+            return node.node_value
+
+        # [node, its depth, index of the next input to look at]
+        stack = [[node, depth, 0]]
+        on_stack = {node.id}
+        while stack:
+            frame = stack[-1]
+            this_node, this_depth, idx = frame
+            if idx < 2:
+                frame[2] += 1
+                v = (this_node.value1, this_node.value2)[idx]
+                if isinstance(v, LogicNode):
+                    if v.id in on_stack:
+                        raise ValueError(f"Wire {v.id} depends on itself")
+                    if not self._called(v, this_depth + 1):
+                        stack.append([v, this_depth + 1, 0])
+                        on_stack.add(v.id)
+                continue
+
+            # every input is worked out now
+            stack.pop()
+            on_stack.discard(this_node.id)
+            a, b = (
+                v.node_value if isinstance(v, LogicNode) else v or 0
+                for v in (this_node.value1, this_node.value2)
+            )
+            start = time.perf_counter()
+            this_node._compute(a, b)
+            self.gate_time[this_node.operator_name()] += time.perf_counter() - start
+        return node.node_value
+
+    def report(self, top: int = 10) -> str:
+        """
+        Return a readable summary, including the top most evaluated nodes
+        """
+        lines = [
+            f"provide() calls: {self.hits + self.misses} ({self.hits} cached, {self.misses} evaluated)",
+            f"deepest call: {self.max_depth}",
+            "time per gate type:",
+        ]
+        for name, seconds in sorted(self.gate_time.items(), key=lambda x: -x[1]):
+            lines.append(f"    {name}: {seconds * 1000:.3f}ms")
+        lines.append(f"most evaluated nodes:")
+        for node_id, count in self.evaluations.most_common(top):
+            lines.append(f"    {node_id}: {count}")
+        return "\n".join(lines)
+
+
+class CompiledBoard:
+    """
+    A LogicBoard flattened into a list of (operation, destination, a, b) instructions over a
+    register file. Every wire and every distinct constant gets its own register, register 0
+    always holds 0 and stands in for a missing second input. The instructions are in
+    dependency order so a single pass over them resolves every wire without any recursion.
+    """
+
+    def __init__(self, wire_names: List[str]):
+        # wire name -> register index
+        self.slots = {name: idx for idx, name in enumerate(wire_names, start=1)}
+        # the starting register file, constants loaded and everything else 0
+        self.registers = [0] * (len(self.slots) + 1)
+        self.constants = dict()
+        self.program = []
+        # register index -> position of the instruction that writes it
+        self.positions = dict()
+        # the program grouped for run_levels(), built when first needed
+        self._levels = None
+
+    def operand(self, v) -> int:
+        """
+        Return the register holding v, which is a LogicNode, a constant or None
+        """
+        if v is None:
+            return 0
+        if isinstance(v, int):
+            if v not in self.constants:
+                self.constants[v] = len(self.registers)
+                self.registers.append(v)
+            return self.constants[v]
+        return self.slots[v.id]
+
+    def instruction_for(self, node: LogicNode) -> tuple:
+        return (
+            node.node_type,
+            self.slots[node.id],
+            self.operand(node.value1),
+            self.operand(node.value2),
+        )
+
+    def add(self, node: LogicNode):
+        """
+        Append the instruction for node, everything it reads must already have been added
+        """
+        self.positions[self.slots[node.id]] = len(self.program)
+        self.program.append(self.instruction_for(node))
+
+    def patch(self, node: LogicNode) -> bool:
+        """
+        Rewrite the instruction for a reconfigured node in place, returns False if that can't be
+        done without re-sorting (a new wire, or an input that isn't evaluated before the node,
+        which includes the node itself)
+        """
+        if node.id not in self.slots or node.node_type not in LogicNode.OPERATIONS:
+            return False
+        position = self.positions[self.slots[node.id]]
+        for v in (node.value1, node.value2):
+            if isinstance(v, LogicNode):
+                if (
+                    v.id not in self.slots
+                    or self.positions[self.slots[v.id]] >= position
+                ):
+                    return False
+        self.program[position] = self.instruction_for(node)
+        self._levels = None
+        return True
+
+    def cone(self, targets: Iterable[int], stop_at: Iterable[int] = ()) -> List[tuple]:
+        """
+        Return just the instructions needed to work out the target registers, in program order,
+        without looking behind any register in stop_at
+        """
+        stop_at = set(stop_at)
+        needed = set(targets)
+        kept = []
+        for instruction in reversed(self.program):
+            dest = instruction[1]
+            if dest in needed:
+                kept.append(instruction)
+                if dest not in stop_at:
+                    needed.update(instruction[2:])
+        kept.reverse()
+        return kept
+
+    def run_batch(
+        self, overrides: Dict[str, Sequence[int]], output: str
+    ) -> "np.ndarray":
+        """
+        Evaluate the program for a whole batch of inputs at once, every register holds a numpy
+        uint16 array with one entry per batch member (or a scalar while it doesn't depend on
+        any of the overrides). overrides maps wire name -> the value forced onto that wire for
+        each batch member. Returns the value of the output wire for each batch member.
+        """
+        if np is None:
+            raise ImportError("run_batch requires numpy")
+        forced = {
+            self.slots[name]: np.asarray(values, dtype=np.uint16)
+            for name, values in overrides.items()
+        }
+        shape = np.broadcast_shapes(*(values.shape for values in forced.values()))
+
+        registers = [np.uint16(value) for value in self.registers]
+        for dest, values in forced.items():
+            registers[dest] = values
+        # 16 bit arithmetic takes care of the mask for us
+        operations = LogicNode.OPERATIONS
+        target = self.slots[output]
+        for op, dest, a, b in self.cone([target], stop_at=forced):
+            if dest not in forced:
+                registers[dest] = operations[op](registers[a], registers[b])
+        return np.broadcast_to(registers[target], shape).copy()
+
+    def to_source(self, function_name: str = "evaluate") -> str:
+        """
+        Return the source of a straight-line python function that evaluates the board and returns
+        a dict of wire name -> value, one local per wire, constants inlined and the 16 bit mask
+        only applied where a result can grow (LSHIFT)
+        """
+        names = {idx: name for name, idx in self.slots.items()}
+
+        def operand(register: int) -> str:
+            if register in names:
+                return f"w_{names[register]}"
+            return str(self.registers[register])
+
+        lines = [f"def {function_name}():"]
+        for op, dest, a, b in self.program:
+            a, b = operand(a), operand(b)
+            if LogicNode.NOP == op:
+                expression = a
+            elif LogicNode.AND == op:
+                expression = f"{a} & {b}"
+            elif LogicNode.OR == op:
+                expression = f"{a} | {b}"
+            elif LogicNode.NOT == op:
+                expression = f"{a} ^ 0xFFFF"
+            elif LogicNode.RSHIFT == op:
+                expression = f"{a} >> {b}"
+            elif b.isdigit() and int(b) >= 16:
+                # LSHIFT everything off the top
+                expression = "0"
+            else:
+                expression = f"({a} << {b}) & 0xFFFF"
+            lines.append(f"    w_{names[dest]} = {expression}")
+
+        results = ", ".join(f'"{name}": w_{name}' for name in self.slots)
+        lines.append(f"    return {{{results}}}")
+        return "\n".join(lines) + "\n"
+
+    def levels(self) -> List[List[tuple]]:
+        """
+        Return the program grouped by dependency level, each level being a list of
+        (operation, destinations, a registers, b registers) with the registers as numpy index
+        arrays. Everything in a level only reads registers written by earlier levels.
+        """
+        if self._levels is None:
+            level_of = [0] * len(self.registers)
+            grouped = defaultdict(lambda: defaultdict(list))
+            for op, dest, a, b in self.program:
+                level_of[dest] = 1 + max(level_of[a], level_of[b])
+                grouped[level_of[dest]][op].append((dest, a, b))
+
+            self._levels = []
+            for level in sorted(grouped):
+                this_level = []
+                for op, instructions in grouped[level].items():
+                    dest, a, b = np.array(instructions, dtype=np.intp).T
+                    this_level.append((op, dest, a, b))
+                self._levels.append(this_level)
+        return self._levels
+
+    def run_levels(self) -> "np.ndarray":
+        """
+        Evaluate the program one dependency level at a time, every gate of the same type in a
+        level is done together as one numpy gather / compute / scatter over a uint16 register
+        file. Returns the final register file.
+        """
+        if np is None:
+            raise ImportError("run_levels requires numpy")
+        registers = np.array(self.registers, dtype=np.uint16)
+        operations = LogicNode.OPERATIONS
+        for this_level in self.levels():
+            for op, dest, a, b in this_level:
+                registers[dest] = operations[op](registers[a], registers[b])
+        return registers
+
+    def run(self) -> List[int]:
+        """
+        Evaluate the program and return the final register file
+        """
+        registers = list(self.registers)
+        operations = LogicNode.OPERATIONS
+        for op, dest, a, b in self.program:
+            registers[dest] = operations[op](registers[a], registers[b]) & 0xFFFF
+        return registers
+
+    def rerun(self, registers: List[int], positions) -> List[int]:
+        """
+        Re-evaluate only the instructions at the given positions, in program order, on top of
+        an existing register file
+        """
+        # a patch may have brought in new constants
+        registers.extend(self.registers[len(registers) :])
+        operations = LogicNode.OPERATIONS
+        program = self.program
+        for position in sorted(positions):
+            op, dest, a, b = program[position]
+            registers[dest] = operations[op](registers[a], registers[b]) & 0xFFFF
+        return registers
+
+
 class LogicBoard:
     def __init__(self):
         """
         Initialise an empty board
         """
         self.nodes = dict()
+        # wire name -> names of the nodes that read it
+        self.fanout = dict()
+        # the compiled form of the board and its latest results, rebuilt when needed
+        self.compiled = None
+        self.registers = None
+        # program positions whose registers are out of date
+        self.dirty = set()
+        # the ProvideProfile watching this board, see profile()
+        self.profiler = None
 
     def add_one_instruction(self, instruction: str):
         """
@@ -275,52 +642,145 @@ class LogicBoard:
             a = components[0]
             b = components[2]
 
-        # step 2, turn the a and b widgets into either nodes or integer values
-        if a is not None:
-            if a[0] in "0123456789":
-                # it's an int
-                a = int(a)
-            else:
-                # we need to find / create a node..
-                if a not in self.nodes:
-                    self.nodes[a] = LogicNode(a)
-                a = self.nodes[a]
-        if b is not None:
-            if b[0] in "0123456789":
-                b = int(b)
-            else:
-                if b not in self.nodes:
-                    self.nodes[b] = LogicNode(b)
-                b = self.nodes[b]
-        # ok, so now we have an action and two either nodes or ints..
+        # step 2, turn the a and b widgets into either wire names or integer values
+        if a is not None and a[0] in "0123456789":
+            # it's an int
+            a = int(a)
+        if b is not None and b[0] in "0123456789":
+            b = int(b)
+        # ok, so now we have an action and two either wire names or ints..
         # print(f"ins: {instruction}, a={a}, b={b}, op={action}")
-        # we need to add this node if necessary
-        if target_node_name not in self.nodes:
-            self.nodes[target_node_name] = LogicNode(target_node_name)
-        target_node = self.nodes[target_node_name]
-
-        # and configure it
-        op_values = {
-            "NOP": LogicNode.NOP,
-            "OR": LogicNode.OR,
-            "NOT": LogicNode.NOT,
-            "AND": LogicNode.AND,
-            "LSHIFT": LogicNode.LSHIFT,
-            "RSHIFT": LogicNode.RSHIFT,
-        }
-        target_node.configure(op_values[action], a, b)
+        self.add_node(target_node_name, OP_VALUES[action], a, b)
         print(f"ins: {instruction}")
 
+    def add_node(
+        self,
+        node_name: str,
+        node_type: int,
+        value1: Union[int, str, None],
+        value2: Union[int, str, None] = None,
+    ):
+        """
+        Configure node_name, creating it if needed, inputs are constants, wire names or None
+        """
+
+        def wire(v):
+            # we need to find / create a node for anything that isn't a constant..
+            if isinstance(v, str):
+                if v not in self.nodes:
+                    self.nodes[v] = LogicNode(v)
+                return self.nodes[v]
+            return v
+
+        value1 = wire(value1)
+        value2 = wire(value2)
+        target_node = wire(node_name)
+        old_inputs = LogicBoard._wire_inputs(target_node)
+        target_node.configure(node_type, value1, value2)
+        self._reconfigured(target_node, old_inputs)
+
     def load_from_file(self, filename: str):
         """
         Read a file full of wiring instructions and add them to the current board
         """
         with open(filename, "r") as f:
-            for this_line in f:
-                this_line = this_line.strip()
-                if "" != this_line:
-                    # this must be an instruction, let's run it..
-                    self.add_one_instruction(this_line)
+            self.load_from_text(f.read())
+
+    def load_from_text(self, text: str):
+        """
+        Add every instruction in text to the board in one go, quietly
+        The whole board is worked out again next time a value is asked for
+        """
+        matches = INSTRUCTION_PATTERN.findall(text)
+        lines = [
+            this_line for this_line in text.splitlines() if "" != this_line.strip()
+        ]
+        if len(matches) != len(lines):
+            for this_line in lines:
+                if INSTRUCTION_PATTERN.match(this_line) is None:
+                    raise ValueError(f"Cannot understand this instruction: {this_line}")
+            # no single line is to blame, so it's the line breaks (old mac style \r for one)
+            raise ValueError(
+                f"Found {len(matches)} instructions in {len(lines)} lines of text"
+            )
+
+        nodes = self.nodes
+        fanout = self.fanout
+
+        def wire(v):
+            if v[0] in "0123456789":
+                return int(v)
+            if v not in nodes:
+                nodes[v] = LogicNode(v)
+            return nodes[v]
+
+        for a, op, b, is_not, not_a, nop_a, target_name in matches:
+            if op:
+                node_type, value1, value2 = OP_VALUES[op], wire(a), wire(b)
+            elif is_not:
+                node_type, value1, value2 = LogicNode.NOT, wire(not_a), None
+            else:
+                node_type, value1, value2 = LogicNode.NOP, wire(nop_a), None
+            target = wire(target_name)
+            if LogicNode.UNKNOWN != target.node_type:
+                # being rewired, forget the old inputs
+                for this_input in LogicBoard._wire_inputs(target):
+                    fanout[this_input].discard(target_name)
+            target.configure(node_type, value1, value2)
+            for v in (value1, value2):
+                if isinstance(v, LogicNode):
+                    readers = fanout.get(v.id)
+                    if readers is None:
+                        readers = fanout[v.id] = set()
+                    readers.add(target_name)
+
+        # cheaper to start again than to track what changed
+        self.compiled = None
+        self.recalculate()
+
+    @staticmethod
+    def _wire_inputs(node: LogicNode) -> set:
+        """
+        names of the wires feeding this node
+        """
+        return {v.id for v in (node.value1, node.value2) if isinstance(v, LogicNode)}
+
+    def downstream_of(self, node_name: str) -> set:
+        """
+        Return the names of node_name and of every node that depends on it, directly or not
+        """
+        cone = {node_name}
+        to_visit = [node_name]
+        while to_visit:
+            for this_reader in self.fanout.get(to_visit.pop(), ()):
+                if this_reader not in cone:
+                    cone.add(this_reader)
+                    to_visit.append(this_reader)
+        return cone
+
+    def _reconfigured(self, node: LogicNode, old_inputs: set):
+        """
+        Keep the fan-out index up to date and throw away only the answers downstream of node
+        """
+        new_inputs = LogicBoard._wire_inputs(node)
+        for this_input in old_inputs - new_inputs:
+            self.fanout[this_input].discard(node.id)
+        for this_input in new_inputs:
+            self.fanout.setdefault(this_input, set()).add(node.id)
+
+        if self.compiled is not None and not self.compiled.patch(node):
+            self.compiled = None
+
+        cone = self.downstream_of(node.id)
+        for name in cone:
+            self.nodes[name].clear_answer()
+        if self.compiled is None or self.registers is None:
+            self.registers = None
+            self.dirty = set()
+        else:
+            slots = self.compiled.slots
+            positions = self.compiled.positions
+            self.dirty.update(positions[slots[name]] for name in cone)
 
     def recalculate(self):
         """
@@ -328,20 +788,222 @@ class LogicBoard:
         """
         for this_node in self.nodes.values():
             this_node.clear_answer()
+        self.registers = None
+        self.dirty = set()
+
+    def compile(self) -> CompiledBoard:
+        """
+        Sort the board into dependency order and flatten it into a CompiledBoard
+        Wires that are used but never configured, and loops, are reported here as a ValueError
+        """
+        compiled = CompiledBoard(list(self.nodes))
+
+        # Kahn's algorithm, count the wire inputs of each node and who depends on them
+        waiting_on = dict()
+        dependents = {name: [] for name in self.nodes}
+        for name, this_node in self.nodes.items():
+            if this_node.node_type not in LogicNode.OPERATIONS:
+                raise ValueError(f"Wire {name} is used but never configured")
+            inputs = {
+                v.id
+                for v in (this_node.value1, this_node.value2)
+                if isinstance(v, LogicNode)
+            }
+            waiting_on[name] = len(inputs)
+            for this_input in inputs:
+                dependents[this_input].append(name)
+
+        ready = deque(name for name, count in waiting_on.items() if 0 == count)
+        while ready:
+            name = ready.popleft()
+            compiled.add(self.nodes[name])
+            for this_dependent in dependents[name]:
+                waiting_on[this_dependent] -= 1
+                if 0 == waiting_on[this_dependent]:
+                    ready.append(this_dependent)
+
+        if len(compiled.program) != len(self.nodes):
+            stuck = sorted(name for name, count in waiting_on.items() if count > 0)
+            raise ValueError(f"These wires depend on themselves: {stuck}")
+
+        return compiled
+
+    def optimised(
+        self, outputs: Iterable[str], keep: Iterable[str] = ()
+    ) -> Tuple["LogicBoard", int]:
+        """
+        Return a new board that only works out the outputs, and how many nodes it got rid of
+        - anything outside the fan-in cone of the outputs is dropped
+        - gates whose inputs are all constants are folded into constants
+        - pass-through (NOP) chains are collapsed, readers go straight to the source
+        The outputs always survive, as a constant NOP if need be. Wires in keep survive as they
+        are and are never folded, so that they can still be overridden on the new board.
+        """
+        outputs = list(outputs)
+        keep = set(keep)
+        compiled = self.compiled if self.compiled is not None else self.compile()
+        names = {idx: name for name, idx in compiled.slots.items()}
+
+        # wire name -> a constant, or the name of the kept node that carries its value
+        resolved = dict()
+
+        def operand(v):
+            if isinstance(v, LogicNode):
+                return resolved[v.id]
+            return v
+
+        optimised = LogicBoard()
+        for _, dest, _, _ in compiled.cone(compiled.slots[name] for name in outputs):
+            name = names[dest]
+            this_node = self.nodes[name]
+            a = operand(this_node.value1)
+            b = operand(this_node.value2)
+            if name in keep:
+                optimised.add_node(name, this_node.node_type, a, b)
+                resolved[name] = name
+            elif not isinstance(a, str) and not isinstance(b, str):
+                operation = LogicNode.OPERATIONS[this_node.node_type]
+                resolved[name] = mask_to_bits(16, operation(a or 0, b or 0))
+            elif LogicNode.NOP == this_node.node_type:
+                resolved[name] = a
+            else:
+                optimised.add_node(name, this_node.node_type, a, b)
+                resolved[name] = name
+
+        for name in outputs:
+            if name not in optimised.nodes:
+                optimised.add_node(name, LogicNode.NOP, resolved[name])
+
+        return optimised, len(self.nodes) - len(optimised.nodes)
+
+    @contextmanager
+    def profile(self):
+        """
+        Profile provide_for() / iter_values() on this board for the duration of the with block,
+        yields the ProvideProfile. While this is active they walk the nodes one provide() at a
+        time rather than running the compiled program, other boards aren't affected.
+        """
+        previous = self.profiler
+        self.profiler = ProvideProfile()
+        try:
+            yield self.profiler
+        finally:
+            self.profiler = previous
+
+    def _compiled_board(self) -> CompiledBoard:
+        """
+        return the compiled form of the board, compiling it if needed
+        """
+        if self.compiled is None:
+            self.compiled = self.compile()
+            self.registers = None
+        return self.compiled
 
     def provide_for(self, node_name: str):
         """
         return the value for requested node
         """
-        return self.nodes[node_name].provide()
+        if self.profiler is not None:
+            return self.profiler.provide(self.nodes[node_name])
+        compiled = self._compiled_board()
+        if self.registers is None:
+            self.registers = compiled.run()
+            self.dirty = set()
+        elif self.dirty:
+            self.registers = compiled.rerun(self.registers, self.dirty)
+            self.dirty = set()
+        return self.registers[compiled.slots[node_name]]
+
+    def iter_values(self, node_names: Iterable[str]) -> Iterator[Tuple[str, int]]:
+        """
+        Yield (wire, value) for each of the requested wires as soon as it is known
+        Only the union of the cones feeding the requested wires is evaluated, each gate once,
+        in dependency order rather than the order asked for
+        """
+        if self.profiler is not None:
+            for name in node_names:
+                yield name, self.profiler.provide(self.nodes[name])
+            return
+
+        compiled = self._compiled_board()
+        wanted = {compiled.slots[name]: name for name in node_names}
+        if self.registers is not None and not self.dirty:
+            # everything is already worked out
+            for slot, name in wanted.items():
+                yield name, self.registers[slot]
+            return
+
+        registers = list(compiled.registers)
+        operations = LogicNode.OPERATIONS
+        for op, dest, a, b in compiled.cone(wanted):
+            registers[dest] = operations[op](registers[a], registers[b]) & 0xFFFF
+            if dest in wanted:
+                yield wanted[dest], registers[dest]
+
+    def provide_many(self, node_names: Iterable[str]) -> Dict[str, int]:
+        """
+        return a dict of wire -> value for all the requested wires, see iter_values()
+        """
+        return dict(self.iter_values(node_names))
+
+    def provide_batch(
+        self, overrides: Dict[str, Sequence[int]], output: str
+    ) -> "np.ndarray":
+        """
+        return the value of output for every set of forced wire values, see CompiledBoard.run_batch()
+        """
+        return self._compiled_board().run_batch(overrides, output)
 
     def print_values(self):
         """
         output all the current values for each node
         """
         print(f"Summary of values")
-        for this_node in sorted(self.nodes.keys()):
-            print(f"{this_node}: {self.nodes[this_node].provide()}")
+        values = self.provide_many(self.nodes)
+        for this_node in sorted(values):
+            print(f"{this_node}: {values[this_node]}")
+
+
+# bump whenever CompiledBoard.to_source() changes what it generates, so that bytecode cached
+# by function_for_file() from older code is no longer picked up
+CODEGEN_VERSION = 2
+
+
+def function_for_file(
+    filename: str, cache_dir: Optional[str] = None
+) -> Callable[[], Dict[str, int]]:
+    """
+    Return a generated function that evaluates the board in filename, see CompiledBoard.to_source()
+    The compiled bytecode is cached in cache_dir keyed on a hash of the file and CODEGEN_VERSION,
+    so later runs skip parsing the file and sorting the board altogether
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(
+            os.path.dirname(os.path.abspath(filename)), "__day7cache__"
+        )
+    with open(filename, "rb") as f:
+        key = hashlib.sha256(f.read()).hexdigest()
+    # marshal output is only good for the python that wrote it
+    cache_file = os.path.join(
+        cache_dir, f"{key}.v{CODEGEN_VERSION}.{sys.implementation.cache_tag}.bin"
+    )
+
+    if os.path.exists(cache_file):
+        with open(cache_file, "rb") as f:
+            code = marshal.load(f)
+    else:
+        board = LogicBoard()
+        board.load_from_file(filename)
+        code = compile(board.compile().to_source(), filename, "exec")
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_file = f"{cache_file}.tmp"
+        with open(temp_file, "wb") as f:
+            marshal.dump(code, f)
+        os.replace(temp_file, cache_file)
+
+    namespace = dict()
+    exec(code, namespace)
+    return namespace["evaluate"]
 
 
 def main():
@@ -351,14 +1013,18 @@ def main():
     board.print_values()
     part1 = board.provide_for("a")
     print(f"part 1, wire a has a value of {part1}")
+    optimised, removed = board.optimised(["a"], keep=["b"])
+    print(
+        f"part 1, optimised board for wire a keeps {len(optimised.nodes)} nodes, removed {removed}"
+    )
 
     # part 2
     command = f"{part1} -> b"
+    # only the wires downstream of b get worked out again
     board.add_one_instruction(command)
-    board.recalculate()
     part2 = board.provide_for("a")
     print(f"part 2, wire a now has a value of {part2}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
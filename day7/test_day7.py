@@ -1,6 +1,8 @@
+import numpy as np
 import pytest
 
-from day7 import mask_to_bits, LogicNode, LogicBoard
+import day7
+from day7 import mask_to_bits, LogicNode, LogicBoard, function_for_file
 
 
 def test_LogicBoard():
@@ -107,4 +109,382 @@ def test_LogicNode_NOP(input_a, input_b, expected_value):
 )
 def test_mask_to_bits(input_val, expected):
     actual = mask_to_bits(16, input_val)
-    assert actual == expected
\ No newline at end of file
+    assert actual == expected
+
+
+def test_LogicBoard_deep_chain():
+    """
+    far deeper than the recursion limit
+    """
+    board = LogicBoard()
+    board.add_one_instruction("1 -> w0")
+    for idx in range(1, 20_000):
+        board.add_one_instruction(f"w{idx - 1} LSHIFT 1 -> t{idx}")
+        board.add_one_instruction(f"t{idx} RSHIFT 1 -> w{idx}")
+    assert board.provide_for("w19999") == 1
+
+
+def test_LogicBoard_override_and_recalculate():
+    board = LogicBoard()
+    for this_instruction in ["123 -> x", "x AND y -> d", "456 -> y"]:
+        board.add_one_instruction(this_instruction)
+    assert board.provide_for("d") == 72
+    board.add_one_instruction("7 -> y")
+    board.recalculate()
+    assert board.provide_for("d") == 3
+
+
+@pytest.mark.parametrize(
+    "instructions, message",
+    [
+        (["x AND y -> d", "123 -> x"], "never configured"),
+        (["x AND y -> d", "123 -> x", "d OR x -> y"], "depend on themselves"),
+    ],
+)
+def test_LogicBoard_compile_errors(instructions, message):
+    board = LogicBoard()
+    for this_instruction in instructions:
+        board.add_one_instruction(this_instruction)
+    with pytest.raises(ValueError, match=message):
+        board.compile()
+
+
+def test_LogicBoard_override_only_dirties_the_cone():
+    board = LogicBoard()
+    for this_instruction in [
+        "123 -> x",
+        "456 -> y",
+        "x AND y -> d",
+        "x OR y -> e",
+        "d LSHIFT 1 -> f",
+    ]:
+        board.add_one_instruction(this_instruction)
+    assert board.provide_for("f") == 144
+    compiled = board.compiled
+
+    board.add_one_instruction("7 -> x")
+    assert board.compiled is compiled
+    assert board.downstream_of("x") == {"x", "d", "e", "f"}
+    assert len(board.dirty) == 4
+    assert board.provide_for("f") == 0
+    assert board.provide_for("e") == 463
+    assert not board.dirty
+
+    # d now reads a wire that is evaluated after it, which needs a fresh sort
+    board.add_one_instruction("e AND y -> d")
+    assert board.compiled is None
+    assert board.provide_for("f") == 912
+    assert board.downstream_of("e") == {"e", "d", "f"}
+    assert board.downstream_of("y") == {"y", "d", "e", "f"}
+
+    # reading itself can't be patched in either, the loop gets reported by the new compile
+    board.add_one_instruction("x -> x")
+    assert board.compiled is None
+    with pytest.raises(ValueError):
+        board.provide_for("x")
+
+
+def test_LogicBoard_provide_batch():
+    board = LogicBoard()
+    for this_instruction in [
+        "123 -> x",
+        "456 -> y",
+        "x AND y -> d",
+        "d LSHIFT 9 -> f",
+        "NOT f -> h",
+        "h OR y -> i",
+    ]:
+        board.add_one_instruction(this_instruction)
+
+    values = np.arange(65536, dtype=np.uint16)
+    actual = board.provide_batch({"x": values}, "i")
+    assert actual.shape == (65536,)
+    for this_value in (0, 1, 123, 4567, 65535):
+        board.add_one_instruction(f"{this_value} -> x")
+        assert actual[this_value] == board.provide_for("i")
+
+
+def test_LogicBoard_provide_batch_wide_constant():
+    # constants wider than 16 bits are masked, same as provide_for()
+    board = LogicBoard()
+    board.load_from_text("70000 -> c\nx AND c -> d\n1 -> x\n")
+    actual = board.provide_batch({"x": [1, 0xFFFF]}, "d")
+    assert list(actual) == [1 & 70000, 0xFFFF & 70000]
+    assert actual[1] == board.provide_for("c")
+
+
+def test_LogicBoard_provide_batch_unaffected_output():
+    board = LogicBoard()
+    for this_instruction in ["123 -> x", "456 -> y", "NOT y -> z"]:
+        board.add_one_instruction(this_instruction)
+    actual = board.provide_batch({"x": [1, 2, 3]}, "z")
+    assert list(actual) == [65079, 65079, 65079]
+
+
+def test_CompiledBoard_to_source():
+    board = LogicBoard()
+    for this_instruction in [
+        "123 -> x",
+        "456 -> y",
+        "x AND y -> d",
+        "x OR y -> e",
+        "x LSHIFT 2 -> f",
+        "y RSHIFT 2 -> g",
+        "NOT x -> h",
+        "NOT y -> i",
+        "x LSHIFT 16 -> j",
+        "h LSHIFT e -> k",
+        "k -> if",
+    ]:
+        board.add_one_instruction(this_instruction)
+
+    namespace = dict()
+    exec(board.compile().to_source(), namespace)
+    actual = namespace["evaluate"]()
+    for name in board.nodes:
+        assert actual[name] == board.provide_for(name)
+
+
+def test_function_for_file(tmp_path, monkeypatch):
+    netlist = tmp_path / "netlist.txt"
+    netlist.write_text("123 -> x\n456 -> y\nx AND y -> d\nNOT d -> a\n")
+    cache_dir = tmp_path / "cache"
+
+    first = function_for_file(str(netlist), str(cache_dir))
+    assert first()["a"] == 65463
+    assert len(list(cache_dir.iterdir())) == 1
+
+    # the second time round the file must not be parsed at all
+    def no_parsing(*args):
+        raise AssertionError("should have come from the cache")
+
+    monkeypatch.setattr(LogicBoard, "load_from_file", no_parsing)
+    second = function_for_file(str(netlist), str(cache_dir))
+    assert second() == first()
+
+    # so is the same netlist after the code generator has changed
+    monkeypatch.setattr(day7, "CODEGEN_VERSION", day7.CODEGEN_VERSION + 1)
+    with pytest.raises(AssertionError):
+        function_for_file(str(netlist), str(cache_dir))
+
+    # a different netlist is a different cache entry
+    netlist.write_text("1 -> a\n")
+    with pytest.raises(AssertionError):
+        function_for_file(str(netlist), str(cache_dir))
+
+
+def test_LogicBoard_optimised():
+    board = LogicBoard()
+    for this_instruction in [
+        "123 -> x",
+        "456 -> y",
+        "x AND y -> d",
+        "x OR y -> e",
+        "NOT z -> h",
+        "h -> h1",
+        "h1 -> h2",
+        "h2 AND d -> out",
+        "e OR h2 -> out2",
+        "y RSHIFT 2 -> unused",
+        "99 -> z",
+    ]:
+        board.add_one_instruction(this_instruction)
+    board.add_one_instruction("x AND zz -> unused2")
+    board.add_one_instruction("1 -> zz")
+
+    optimised, removed = board.optimised(["out", "h1"])
+    # everything folds away apart from the outputs themselves
+    assert set(optimised.nodes) == {"out", "h1"}
+    assert removed == len(board.nodes) - 2
+    for name in ("out", "h1"):
+        assert optimised.provide_for(name) == board.provide_for(name)
+
+
+def test_LogicBoard_optimised_keeps_real_gates():
+    board = LogicBoard()
+    for this_instruction in [
+        "1 -> k",
+        "b -> b1",
+        "b1 -> b2",
+        "b2 AND k -> c",
+        "k LSHIFT 3 -> k3",
+        "c OR k3 -> a",
+        "k OR k -> spare",
+        "5 -> b",
+    ]:
+        board.add_one_instruction(this_instruction)
+
+    optimised, removed = board.optimised(["a"], keep=["b"])
+    assert set(optimised.nodes) == {"a", "b", "c"}
+    assert removed == 5
+    # c reads b directly and k / k3 are now constants
+    assert optimised.nodes["c"].value1 is optimised.nodes["b"]
+    assert optimised.nodes["c"].value2 == 1
+    assert optimised.nodes["a"].value2 == 8
+
+    for this_value in (5, 6, 65535):
+        board.add_one_instruction(f"{this_value} -> b")
+        optimised.add_one_instruction(f"{this_value} -> b")
+        assert optimised.provide_for("a") == board.provide_for("a")
+
+
+def test_LogicBoard_load_from_text(capsys):
+    instructions = [
+        "123 -> x",
+        "456 -> y",
+        "x AND y -> d",
+        "x OR y -> e",
+        "x LSHIFT 2 -> f",
+        "y RSHIFT 2 -> g",
+        "NOT x -> h",
+        "NOT y -> i",
+        "1 AND d -> j",
+    ]
+    expected = LogicBoard()
+    for this_instruction in instructions:
+        expected.add_one_instruction(this_instruction)
+    capsys.readouterr()
+
+    actual = LogicBoard()
+    actual.load_from_text("\n".join(instructions) + "\n\n")
+    assert "" == capsys.readouterr().out
+    for name in expected.nodes:
+        assert actual.provide_for(name) == expected.provide_for(name)
+    assert actual.fanout == expected.fanout
+
+    # a bulk load on top of an existing board replaces what was there
+    actual.load_from_text("7 -> x")
+    assert actual.provide_for("d") == 0
+    assert actual.downstream_of("y") == {"y", "d", "e", "g", "i", "j"}
+
+    with pytest.raises(ValueError, match="x XOR y"):
+        actual.load_from_text("1 -> a\nx XOR y -> z\n")
+    # every line makes sense on its own, but the bare \r line breaks don't
+    with pytest.raises(ValueError):
+        actual.load_from_text("1 -> a\r2 -> b\r")
+
+
+def test_LogicNode_has_no_dict():
+    node = LogicNode("test_node")
+    assert not hasattr(node, "__dict__")
+
+
+def test_LogicBoard_profile():
+    board = LogicBoard()
+    board.load_from_text(
+        "123 -> x\n456 -> y\nx AND y -> d\nx OR y -> e\nd OR e -> f\nNOT f -> g\n"
+    )
+    other_board = LogicBoard()
+    other_board.load_from_text("1 -> a\nNOT a -> b\n")
+    with board.profile() as profile:
+        assert board.provide_for("g") == board.provide_for("g")
+        # only the board being profiled is watched
+        assert other_board.provide_for("b") == 65534
+    assert board.profiler is None
+
+    # g, f, d, e, x, y each worked out once, x and y come from the cache for e
+    assert profile.misses == 6
+    assert profile.hits == 3
+    assert profile.max_depth == 4
+    assert profile.evaluations == {name: 1 for name in "xydefg"}
+    assert set(profile.gate_time) == {
+        "Pass-through",
+        "Bitwise AND",
+        "Bitwise OR",
+        "Bitwise NOT",
+    }
+    assert "deepest call: 4" in profile.report()
+
+
+def test_LogicBoard_profile_deep_chain():
+    # far deeper than the recursion limit
+    depth = 4000
+    board = LogicBoard()
+    board.load_from_text(
+        "1 -> w0\n" + "".join(f"NOT w{i} -> w{i + 1}\n" for i in range(depth))
+    )
+    expected = board.provide_for(f"w{depth}")
+    board.recalculate()
+    with board.profile() as profile:
+        assert board.provide_for(f"w{depth}") == expected
+    assert profile.misses == depth + 1
+    assert profile.hits == 0
+    assert profile.max_depth == depth + 1
+
+
+def test_LogicBoard_profile_loop():
+    board = LogicBoard()
+    board.load_from_text("x -> y\ny -> x\n")
+    with board.profile():
+        with pytest.raises(ValueError):
+            board.provide_for("x")
+
+
+def test_CompiledBoard_run_levels():
+    board = LogicBoard()
+    board.load_from_text(
+        "\n".join(
+            [
+                "123 -> x",
+                "456 -> y",
+                "x AND y -> d",
+                "x OR y -> e",
+                "x LSHIFT 2 -> f",
+                "y RSHIFT 2 -> g",
+                "NOT x -> h",
+                "NOT y -> i",
+                "d OR e -> j",
+                "j LSHIFT 15 -> k",
+                "k AND h -> l",
+                "70000 -> m",
+            ]
+        )
+    )
+    compiled = board.compile()
+    # x y m / d e f g h i / j / k / l
+    assert [len(this_level) for this_level in compiled.levels()] == [1, 5, 1, 1, 1]
+    expected = compiled.run()
+    actual = compiled.run_levels()
+    for name, slot in compiled.slots.items():
+        assert actual[slot] == expected[slot]
+
+
+def test_CompiledBoard_wide_shift_constants():
+    # the constants are masked to 16 bits as they come in, so 65536 shifts by 0 everywhere
+    board = LogicBoard()
+    board.load_from_text(
+        "5 -> x\nx RSHIFT 65536 -> d\nx LSHIFT 65537 -> e\n65541 AND x -> f\n"
+    )
+    compiled = board.compile()
+    namespace = dict()
+    exec(compiled.to_source(), namespace)
+    generated = namespace["evaluate"]()
+    registers = compiled.run()
+    level_registers = compiled.run_levels()
+    for name, expected in (("d", 5), ("e", 10), ("f", 5)):
+        slot = compiled.slots[name]
+        assert board.provide_for(name) == expected
+        assert board.nodes[name].provide() == expected
+        assert registers[slot] == expected
+        assert level_registers[slot] == expected
+        assert generated[name] == expected
+        assert list(board.provide_batch({"x": [5]}, name)) == [expected]
+
+
+def test_LogicBoard_provide_many():
+    board = LogicBoard()
+    board.load_from_text(
+        "123 -> x\n456 -> y\nx AND y -> d\nx OR y -> e\nNOT x -> h\nh AND e -> q\n"
+    )
+    expected = {name: board.provide_for(name) for name in board.nodes}
+    board.recalculate()
+
+    # only the cones of d and h get evaluated, nothing gets stored on the board
+    streamed = list(board.iter_values(["h", "d"]))
+    assert len(streamed) == 2
+    assert dict(streamed) == {"d": expected["d"], "h": expected["h"]}
+    assert board.registers is None
+
+    assert board.provide_many(board.nodes) == expected
+    board.provide_for("x")
+    assert board.provide_many(["q", "e"]) == {"q": expected["q"], "e": expected["e"]}